@@ -0,0 +1,153 @@
+"""Headless batch triage over JSONL patient records
+
+Each input line is a JSON object with the same fields as the app's form
+(symptoms, duration, severity, location, onset, age, gender, medical_history,
+medications, allergies, lifestyle), plus optional "id", "language", and
+"image" (a path to a photo) or "images" (a list of paths). Results are appended to the output file as
+JSONL, one line per record, and records already completed there are skipped,
+so an interrupted run can simply be started again.
+
+    python batch_triage.py records.jsonl results.jsonl --workers 4 --rpm 60
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from image_preprocessing import preprocess_image
+from red_flags import pre_triage
+from scheduler import scheduler
+from triage import (ASSESSMENT_PIPELINE, OUTPUT_FORMAT, OUTPUT_FORMATS, PIPELINE_MODES, RESPONSE_CACHE_BYPASS,
+                    extract_triage_fields, is_error_response, run_assessment_pipeline)
+
+PATIENT_FIELDS = ('symptoms', 'duration', 'severity', 'location', 'onset', 'age', 'gender',
+                  'medical_history', 'medications', 'allergies', 'lifestyle')
+
+
+def read_records(path):
+    """Yield (record_id, record) pairs from a JSONL file, using the line number when there is no id"""
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if line.strip():
+                record = json.loads(line)
+                yield str(record.get('id', line_number)), record
+
+
+def completed_ids(path):
+    """Return the ids of records that already have a successful result in path"""
+    done = set()
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    continue  # A line cut short by an interrupted run
+                if result.get('status') == 'ok':
+                    done.add(str(result['id']))
+    return done
+
+
+def triage_record(record_id, record, language="English", mode=ASSESSMENT_PIPELINE, use_cache=True,
+                  max_retries=3, backoff=2.0, output_format=OUTPUT_FORMAT):
+    """Assess one patient record, retrying failed assessments with jittered exponential backoff
+
+    Rate limits and server errors are already retried call by call by the model scheduler.
+    """
+    started = time.perf_counter()
+    result = {'id': record_id}
+    try:
+        user_input = {field: record.get(field, "") for field in PATIENT_FIELDS}
+        images = []
+        for path in record.get('images') or ([record['image']] if record.get('image') else []):
+            with open(path, "rb") as f:
+                images.append(preprocess_image(f.read()))
+
+        for attempt in range(1, max_retries + 2):
+            response, pipeline = run_assessment_pipeline(user_input, record.get('language', language), images,
+                                                         mode=mode, use_cache=use_cache,
+                                                         output_format=output_format)
+            if not is_error_response(response) or attempt > max_retries:
+                break
+            time.sleep(backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+
+        result.update(status='error' if is_error_response(response) else 'ok', attempts=attempt,
+                      pipeline=pipeline, response=response, **extract_triage_fields(response))
+        # Local red flags are recorded and, as in the app, always count as emergencies
+        red_flag = pre_triage(user_input)
+        result['red_flag'] = red_flag.reason if red_flag else None
+        result['is_emergency'] = result['is_emergency'] or red_flag is not None
+    except Exception as e:
+        result.update(status='error', error=str(e))
+    result['seconds'] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def run_batch(records, workers=4, requests_per_minute=60, skip_ids=(), **options):
+    """Assess (record_id, record) pairs on a worker pool, yielding results as they finish
+
+    Only a bounded number of records is read ahead, so inputs of any size
+    stream through in constant memory. Extra options go to triage_record.
+    The request budget applies to the shared model scheduler while the batch
+    runs, and the scheduler's own limits are restored when it ends.
+    """
+    with scheduler.limits(requests_per_minute=requests_per_minute):
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = set()
+            for record_id, record in records:
+                if record_id in skip_ids:
+                    continue
+                pending.add(executor.submit(triage_record, record_id, record, **options))
+                if len(pending) >= workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+            for future in pending:
+                yield future.result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run JSONL patient records through the health assessment")
+    parser.add_argument("input", help="JSONL file of patient records")
+    parser.add_argument("output", help="JSONL file results are appended to; completed records are skipped")
+    parser.add_argument("--language", default="English", choices=["English", "Hindi", "Telugu"],
+                        help="output language for records without a language field")
+    parser.add_argument("--pipeline", default=ASSESSMENT_PIPELINE, choices=PIPELINE_MODES,
+                        help="how records with images are assessed")
+    parser.add_argument("--output-format", default=OUTPUT_FORMAT, choices=OUTPUT_FORMATS,
+                        help="ask for free-text or structured JSON assessments")
+    parser.add_argument("--workers", type=int, default=4, help="records assessed at the same time")
+    parser.add_argument("--rpm", type=int, default=60, help="maximum model requests per minute, 0 for no limit")
+    parser.add_argument("--retries", type=int, default=3,
+                        help="times a failed record is assessed again, on top of the scheduler's retries of "
+                             "each rate-limited or failed model call")
+    parser.add_argument("--no-cache", action="store_true", default=RESPONSE_CACHE_BYPASS,
+                        help="always call the model instead of reusing cached assessments")
+    args = parser.parse_args(argv)
+
+    skip_ids = completed_ids(args.output)
+    counts = {'ok': 0, 'error': 0}
+    started = time.perf_counter()
+    with open(args.output, "a", encoding="utf-8") as output:
+        results = run_batch(read_records(args.input), workers=args.workers, requests_per_minute=args.rpm,
+                            skip_ids=skip_ids, language=args.language, mode=args.pipeline,
+                            use_cache=not args.no_cache, max_retries=args.retries,
+                            output_format=args.output_format)
+        for result in results:
+            output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            output.flush()
+            counts[result['status']] += 1
+            if sum(counts.values()) % 100 == 0:
+                print(f"{sum(counts.values())} records done", file=sys.stderr)
+
+    elapsed = time.perf_counter() - started
+    print(f"Done: {counts['ok']} ok, {counts['error']} failed, {len(skip_ids)} skipped "
+          f"in {elapsed:.1f}s", file=sys.stderr)
+    return 1 if counts['error'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
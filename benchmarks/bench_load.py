@@ -0,0 +1,305 @@
+"""Load test the Streamlit app with concurrent sessions against local stub backends
+
+    python benchmarks/bench_load.py --sessions 8 --flows 2
+    python benchmarks/bench_load.py --sessions 16 --latency 1.0 --json load.json
+    python benchmarks/bench_load.py --sessions 16 --latency 1.0 --baseline load.json --tolerance 0.2
+
+Each session is a Streamlit AppTest with its own session state, driven
+through the whole flow: open the page, submit symptoms (which also renders
+the medication links and the PDF report), generate audio, get a nutrition
+plan, then submit red-flag symptoms with a location, which brings up the
+nearby emergency facilities. Sessions run as threads in one process, as they
+would on one server. The model and speech are local stubs and no API keys
+are set, so nothing leaves the machine.
+
+The report has per-interaction latency percentiles, overall throughput, the
+process's peak RSS and its growth per session, and the latency of the spans
+recorded meanwhile. The medication links and the PDF report are rendered
+within other reruns rather than by an interaction of their own, so they are
+timed separately as the "medications" and "pdf" stages, from their sections'
+spans on every rerun that shows them. With --baseline, the script exits with
+status 1 when any interaction's or stage's p95 latency is worse than the saved
+run by more than the tolerance.
+
+Sessions run concurrently only after patching private AppTest internals of
+Streamlit 1.28, so the script refuses to run on any other Streamlit version
+until the patches have been checked against it and SHIMMED_STREAMLIT updated.
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import ROOT, compare_to_baseline, print_table, summarize
+
+INTERACTIONS = ("load", "submit", "audio", "nutrition", "emergency")
+# Sections timed within the reruns that show them, by the span each is rendered in
+STAGE_SPANS = {"medications": "section.medications", "pdf": "section.report"}
+
+# Streamlit release whose AppTest internals allow_untyped_blocks and share_runtime patch
+SHIMMED_STREAMLIT = "1.28."
+
+SYMPTOMS = "Throbbing headache on the right side with nausea and sensitivity to light"
+EMERGENCY_SYMPTOMS = "Crushing chest pain spreading to my left arm, with sweating"
+EMERGENCY_LOCATION = "Hyderabad"
+
+
+def current_rss():
+    """Resident set size of this process in bytes, or 0 where /proc is not available"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+class RSSSampler:
+    """Samples this process's RSS in the background and keeps the peak"""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = current_rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+        if not self.peak:
+            self.peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # Kilobytes on Linux
+
+
+def check_streamlit_version(version):
+    """Stop with an error unless the installed Streamlit is the release the AppTest patches were written for"""
+    if not version.startswith(SHIMMED_STREAMLIT):
+        raise SystemExit(f"bench_load patches private AppTest internals of Streamlit {SHIMMED_STREAMLIT}x, but "
+                         f"{version} is installed. Check allow_untyped_blocks and share_runtime against it, "
+                         f"then update SHIMMED_STREAMLIT.")
+
+
+def record_stages(tracer, record):
+    """Pass each finished stage span to record(stage, seconds, error), besides recording it as usual"""
+    stages = {name: stage for stage, name in STAGE_SPANS.items()}
+    original = tracer.record
+
+    def record_span(name, seconds, span_record):
+        original(name, seconds, span_record)
+        if name in stages:
+            record(stages[name], seconds, span_record.get('error'))
+
+    tracer.record = record_span
+
+
+def allow_untyped_blocks(element_tree):
+    """Let AppTest parse the block an st.empty() placeholder leaves, which Streamlit 1.28's element tree rejects"""
+    original = element_tree.Block.__init__
+
+    def __init__(self, proto, root):
+        if proto is not None and proto.WhichOneof("type") is None:
+            proto = None
+        original(self, proto, root)
+
+    element_tree.Block.__init__ = __init__
+
+
+def share_runtime(app_test):
+    """Let AppTests run in parallel threads under one mock Runtime
+
+    Streamlit 1.28's AppTest swaps a fresh mock Runtime and config in and out
+    around every run, so one session's teardown pulls the media file manager
+    from under another session still running. It also compiles the script
+    again on every run, and compiling in several threads at once fails now
+    and then on Python 3.11. This installs one Runtime for the whole process,
+    leaves the globals alone between runs, and shares one script cache, as a
+    server shares it across sessions.
+    """
+    from unittest.mock import MagicMock
+    from urllib import parse
+
+    from streamlit import config
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime._instance = runtime
+    config.set_option("runner.postScriptGC", False)
+    script_cache = ScriptCache()
+
+    def _run(self, widget_state=None, timeout=None):
+        script_runner = app_test.LocalScriptRunner(self._script_path, self.session_state)
+        script_runner._script_cache = script_cache
+        self._tree = script_runner.run(widget_state, self.query_params, timeout or self.default_timeout)
+        self._tree._runner = self
+        self.query_params = parse.parse_qs(script_runner.event_data[-1]["client_state"].query_string)
+        return self
+
+    app_test.AppTest._run = _run
+
+
+def find(elements, label):
+    """Return the first widget whose label starts with label"""
+    for element in elements:
+        if element.label.startswith(label):
+            return element
+    raise LookupError(f"No widget labelled {label!r}")
+
+
+def run_session(app_test_factory, session, flows, timeout, unique, record):
+    """Drive one session through the flow flows times, calling record(interaction, seconds, error)"""
+    at = app_test_factory.from_file(os.path.join(ROOT, "main.py"), default_timeout=timeout)
+
+    def timed(interaction, action=None):
+        started = time.perf_counter()
+        try:
+            if action:
+                action()  # A widget missing after a broken rerun counts as this interaction failing
+            at.run()
+            error = at.exception[0].message if at.exception else None
+        except Exception as e:
+            error = str(e)
+        record(interaction, time.perf_counter() - started, error)
+        return error is None
+
+    if not timed("load"):
+        return at
+    for flow in range(flows):
+        # Vary the symptoms so the response cache does not answer every flow after the first
+        suffix = f" (session {session}, visit {flow})" if unique else ""
+
+        def submit(symptoms, location=""):
+            at.text_area[0].set_value(symptoms + suffix)
+            find(at.text_input, "📍 Your city").set_value(location)
+            find(at.button, "Get Recommendations").click()
+
+        if not timed("submit", lambda: submit(SYMPTOMS)):
+            continue
+        timed("audio", lambda: find(at.button, "Generate Audio").click())
+        timed("nutrition", lambda: find(at.button, "🍎 Get Nutrition").click())
+        timed("emergency", lambda: submit(EMERGENCY_SYMPTOMS, EMERGENCY_LOCATION))
+    return at
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the app with concurrent simulated sessions")
+    parser.add_argument("--sessions", type=int, default=8, help="sessions running at the same time")
+    parser.add_argument("--flows", type=int, default=2, help="full flows each session runs")
+    parser.add_argument("--latency", type=float, default=0.5, help="stub model latency in seconds")
+    parser.add_argument("--tts-latency", type=float, default=0.1, help="stub speech latency per chunk in seconds")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds one rerun may take before it fails")
+    parser.add_argument("--repeat-input", action="store_true",
+                        help="send the same symptoms every flow, so the response cache answers repeats")
+    parser.add_argument("--json", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 slowdown against the baseline")
+    args = parser.parse_args(argv)
+
+    # Configure the stubs before the app modules read their settings, and keep every API offline
+    os.environ["MODEL_BACKEND"] = "stub"
+    os.environ["STUB_LATENCY"] = str(args.latency)
+    os.environ["TTS_BACKEND"] = "stub"
+    os.environ["STUB_TTS_LATENCY"] = str(args.tts_latency)
+    os.environ["GOOGLE_MAPS_API_KEY"] = ""
+    os.environ["FIRECRAWL_API_KEY"] = ""
+    os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="bench-load-"))
+
+    import streamlit
+    check_streamlit_version(streamlit.__version__)
+
+    import streamlit.testing.v1.app_test as app_test
+    import streamlit.testing.v1.element_tree as element_tree
+    from streamlit.testing.v1 import AppTest
+    from tracing import tracer
+
+    allow_untyped_blocks(element_tree)
+    share_runtime(app_test)
+
+    measured = INTERACTIONS + tuple(STAGE_SPANS)
+    samples = {name: [] for name in measured}
+    failures = {name: 0 for name in measured}
+    first_errors = {}
+    lock = threading.Lock()
+
+    def record(interaction, seconds, error):
+        with lock:
+            samples[interaction].append(seconds)
+            if error is not None:
+                failures[interaction] += 1
+                first_errors.setdefault(interaction, error)
+
+    # One warm-up session imports the app, so the baseline RSS excludes one-off startup memory
+    run_session(AppTest, -1, 1, args.timeout, True, lambda *_: None)
+    record_stages(tracer, record)
+    baseline_rss = current_rss()
+
+    started = time.perf_counter()
+    with RSSSampler() as sampler, ThreadPoolExecutor(max_workers=args.sessions) as executor:
+        futures = [executor.submit(run_session, AppTest, session, args.flows, args.timeout,
+                                   not args.repeat_input, record)
+                   for session in range(args.sessions)]
+        sessions = [future.result() for future in futures]  # Kept alive so their state counts towards the peak
+    elapsed = time.perf_counter() - started
+
+    results = {}
+    for name in measured:
+        if samples[name]:
+            results[name] = {**summarize(samples[name]), 'errors': failures[name]}
+    interactions = sum(len(samples[interaction]) for interaction in INTERACTIONS)
+    flows = len(samples["emergency"])
+    summary = {
+        'sessions': len(sessions),
+        'elapsed_s': elapsed,
+        'flows_per_s': flows / elapsed,
+        'interactions_per_s': interactions / elapsed,
+        'peak_rss_mb': sampler.peak / 2 ** 20,
+        'rss_per_session_mb': max(0, sampler.peak - baseline_rss) / 2 ** 20 / max(1, len(sessions)),
+    }
+
+    print_table(results, columns=('count', 'errors', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms'))
+    print()
+    print(f"{summary['sessions']} sessions, {flows} flows in {elapsed:.1f}s: "
+          f"{summary['flows_per_s']:.2f} flows/s, {summary['interactions_per_s']:.2f} interactions/s")
+    print(f"peak RSS {summary['peak_rss_mb']:.1f} MB, {summary['rss_per_session_mb']:.2f} MB per session "
+          f"above the {baseline_rss / 2 ** 20:.1f} MB baseline")
+    print()
+    spans = sorted(tracer.snapshot(), key=lambda stats: stats['count'] * stats['mean_ms'], reverse=True)
+    print_table({stats['span']: stats for stats in spans[:12]}, columns=('count', 'errors', 'mean_ms', 'p50_ms',
+                                                                       'p95_ms', 'max_ms'))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({**results, 'summary': summary}, f, indent=2)
+
+    failed = sum(failures.values())
+    if failed:
+        print(f"{failed} interactions failed", file=sys.stderr)
+        for interaction, error in first_errors.items():
+            print(f"  {interaction}: {error}", file=sys.stderr)
+    if args.baseline:
+        regressions = compare_to_baseline(results, args.baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions or failed else 0
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
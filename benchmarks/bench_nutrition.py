@@ -0,0 +1,84 @@
+"""Compare nutrition prompt size and wait time before and after the lean, prefetched path
+
+    python benchmarks/bench_nutrition.py --latency 0.5
+
+Prompt tokens are estimated the same way the model scheduler budgets them.
+The legacy prompt embedded the full assessment text; the lean one sends a
+short summary. The wait is what a user sees after clicking the button: a
+full generation when nothing was prefetched, and only the remainder when the
+plan was started as soon as the assessment finished.
+"""
+import argparse
+import os
+import sys
+import time
+
+from common import SAMPLE_INPUT, print_table, summarize
+
+# The prompt the app sent before, repeating the whole assessment
+LEGACY_PROMPT = """As a nutritionist, provide detailed dietary recommendations based on:
+
+                Health Assessment: {assessment}
+
+                Patient Information:
+                - Age: {age}
+                - Gender: {gender}
+                - Conditions: {medical_history}
+                - Medications: {medications}
+                - Allergies: {allergies}
+                - Lifestyle: {lifestyle}
+
+                Provide:
+                1. Recommended foods and avoidances (consider allergies)
+                2. Sample 1-day meal plan
+                3. Key nutrients to focus on
+                4. Hydration recommendations
+                5. Supplement suggestions (if needed)
+                6. Special considerations based on medications
+
+                Format with clear headings and use food emojis for better readability."""
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the nutrition prompt and prefetch")
+    parser.add_argument("--iterations", type=int, default=5, help="button clicks timed per path")
+    parser.add_argument("--latency", type=float, default=0.5, help="stub model latency in seconds")
+    parser.add_argument("--read-time", type=float, default=0.3,
+                        help="seconds between the assessment and the click, while the prefetch runs")
+    args = parser.parse_args(argv)
+
+    os.environ["MODEL_BACKEND"] = "stub"
+    os.environ["STUB_LATENCY"] = str(args.latency)
+    os.environ.setdefault("STUB_CHUNK_DELAY", "0")
+
+    from scheduler import estimate_tokens
+    from triage import (backend, build_assessment_prompt, build_nutrition_prompt, generate_nutrition_recommendations,
+                        parse_assessment, prefetch_nutrition_recommendations)
+
+    for output_format in ("text", "json"):
+        response = backend.generate(build_assessment_prompt(SAMPLE_INPUT, "English", output_format=output_format))
+        result = parse_assessment(response)
+        legacy = estimate_tokens(LEGACY_PROMPT.format(assessment=result.text, **SAMPLE_INPUT))
+        lean = estimate_tokens(build_nutrition_prompt(result, SAMPLE_INPUT))
+        print(f"{output_format} assessment: nutrition prompt ~{legacy} tokens before, ~{lean} after "
+              f"({100 * (legacy - lean) / legacy:.0f}% fewer)")
+
+    cold, prefetched = [], []
+    for _ in range(args.iterations):
+        started = time.perf_counter()
+        generate_nutrition_recommendations(result, SAMPLE_INPUT, use_cache=False)
+        cold.append(time.perf_counter() - started)
+
+        future = prefetch_nutrition_recommendations(result, SAMPLE_INPUT, use_cache=False)
+        time.sleep(args.read_time)
+        started = time.perf_counter()
+        future.result()
+        prefetched.append(time.perf_counter() - started)
+
+    print()
+    print_table({'click_wait_cold': summarize(cold), 'click_wait_prefetched': summarize(prefetched)})
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
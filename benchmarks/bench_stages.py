@@ -0,0 +1,114 @@
+"""Benchmark each stage of the assessment pipeline offline, using the stub model backend
+
+    python benchmarks/bench_stages.py --iterations 200
+    python benchmarks/bench_stages.py --json bench_output.json
+    python benchmarks/bench_stages.py --baseline bench_output.json --tolerance 0.2
+
+With --baseline, the script exits with status 1 when any stage's p95 latency
+is worse than the saved run by more than the tolerance.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from common import SAMPLE_INPUT, compare_to_baseline, print_table, summarize
+
+
+def time_stage(function, iterations, warmup=3):
+    """Call function repeatedly and return the duration of each call in seconds"""
+    for _ in range(warmup):
+        function()
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def time_first_chunk(stream_factory, iterations):
+    """Return the time until the first streamed chunk for each call"""
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        stream = stream_factory()
+        next(stream)
+        samples.append(time.perf_counter() - started)
+        for _ in stream:
+            pass
+    return samples
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the assessment pipeline stages offline")
+    parser.add_argument("--iterations", type=int, default=100, help="timed calls per stage")
+    parser.add_argument("--latency", type=float, default=0.0, help="stub model latency in seconds")
+    parser.add_argument("--json", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 slowdown against the baseline")
+    args = parser.parse_args(argv)
+
+    # Configure the stub before the app modules read their settings
+    os.environ["MODEL_BACKEND"] = "stub"
+    os.environ["STUB_LATENCY"] = str(args.latency)
+    os.environ.setdefault("STUB_CHUNK_DELAY", "0")
+
+    from facility_index import facility_index
+    from medication_catalog import medication_catalog
+    from medication_lexicon import find_medications
+    from red_flags import pre_triage
+    from report import render_report
+    from triage import (backend, build_assessment_prompt, color_urgency_level, enhance_medication_display,
+                        extract_triage_fields, parse_assessment, render_assessment_html, response_cache_key,
+                        run_assessment_pipeline)
+    from tts_engine import split_text
+
+    prompt = build_assessment_prompt(SAMPLE_INPUT, "English")
+    response = backend.generate(prompt)
+    medications = extract_triage_fields(response)['medications']
+    json_response = backend.generate(build_assessment_prompt(SAMPLE_INPUT, "English", output_format="json"))
+
+    def postprocess():
+        find_medications.cache_clear()  # Measure a fresh pass, not the memoized result
+        extract_triage_fields(response)
+
+    def render_html():
+        find_medications.cache_clear()
+        enhance_medication_display(color_urgency_level(response))
+
+    stages = {
+        'pre_triage': lambda: pre_triage(SAMPLE_INPUT),
+        'prompt_build': lambda: build_assessment_prompt(SAMPLE_INPUT, "English"),
+        'cache_key': lambda: response_cache_key(SAMPLE_INPUT, "English"),
+        'generation': lambda: backend.generate(prompt),
+        'postprocess': postprocess,
+        'render_html': render_html,
+        'parse_json': lambda: parse_assessment(json_response),
+        'render_html_json': lambda: render_assessment_html(parse_assessment(json_response)),
+        'catalog_lookup': lambda: [medication_catalog().products(name) for name in medications],
+        'facility_nearest': lambda: facility_index().nearest(17.385, 78.4867, k=20, radius=5000),
+        'render_pdf': lambda: render_report(response, medications, response),
+        'tts_split': lambda: split_text(response),
+        'pipeline_uncached': lambda: run_assessment_pipeline(SAMPLE_INPUT, "English", use_cache=False),
+        'pipeline_cached': lambda: run_assessment_pipeline(SAMPLE_INPUT, "English", use_cache=True),
+    }
+    results = {name: summarize(time_stage(function, args.iterations)) for name, function in stages.items()}
+    results['stream_first_chunk'] = summarize(time_first_chunk(lambda: backend.stream(prompt), args.iterations))
+
+    print_table(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        regressions = compare_to_baseline(results, args.baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
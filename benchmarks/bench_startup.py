@@ -0,0 +1,101 @@
+"""Benchmark cold start and per-rerun client setup of the Streamlit app
+
+    python benchmarks/bench_startup.py --iterations 10
+    python benchmarks/bench_startup.py --json startup.json
+    python benchmarks/bench_startup.py --baseline startup.json --tolerance 0.2
+
+Cold start imports main.py in a fresh interpreter, which is what a new
+container pays before serving its first page. The script also reports which
+heavy libraries that import pulled in; they should all load only on first use.
+With --baseline, the script exits with status 1 when any stage's p95 latency
+is worse than the saved run by more than the tolerance.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from common import ROOT, compare_to_baseline, print_table, summarize
+
+# Libraries that should be imported only when their feature is first used
+LAZY_MODULES = ('google.generativeai', 'googlemaps', 'firecrawl', 'gtts', 'fpdf', 'folium')
+
+# A key in the format googlemaps accepts, so the client can be built offline
+FAKE_MAPS_KEY = "AIza" + "0" * 35
+
+COLD_IMPORT = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+print(json.dumps({{'seconds': time.perf_counter() - started,
+                   'loaded': [name for name in {lazy!r} if name in sys.modules]}}))
+"""
+
+
+def time_cold_import(module, iterations):
+    """Import module in fresh interpreters, returning the import durations and the lazy modules it loaded"""
+    samples, loaded = [], set()
+    code = COLD_IMPORT.format(module=module, lazy=LAZY_MODULES)
+    for _ in range(iterations):
+        output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=os.environ,
+                                capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        samples.append(result['seconds'])
+        loaded.update(result['loaded'])
+    return samples, sorted(loaded)
+
+
+def time_calls(function, iterations):
+    """Call function repeatedly and return the duration of each call in seconds"""
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark app cold start and client setup")
+    parser.add_argument("--iterations", type=int, default=5, help="fresh interpreters per cold start stage")
+    parser.add_argument("--json", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 slowdown against the baseline")
+    args = parser.parse_args(argv)
+
+    os.environ["MODEL_BACKEND"] = "gemini"  # Measure the real backend, whose SDK must load lazily
+    os.environ["GOOGLE_MAPS_API_KEY"] = FAKE_MAPS_KEY
+
+    results = {}
+    results['import_streamlit'] = summarize(time_cold_import("streamlit", args.iterations)[0])
+    import_samples, loaded = time_cold_import("main", args.iterations)
+    results['import_main'] = summarize(import_samples)
+
+    import googlemaps
+
+    from clients import maps_client
+
+    # Client setup paid on every rerun before the shared factory, and after it
+    results['maps_client_new'] = summarize(time_calls(
+        lambda: googlemaps.Client(key=FAKE_MAPS_KEY), args.iterations * 20))
+    results['maps_client_shared'] = summarize(time_calls(maps_client, args.iterations * 20))
+
+    print_table(results)
+    print(f"\nLazy libraries loaded by importing main: {', '.join(loaded) or 'none'}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        regressions = compare_to_baseline(results, args.baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions or loaded else 0
+    return 1 if loaded else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+"""Helpers shared by the benchmark scripts"""
+import json
+import os
+import sys
+
+# Let the scripts import the app modules when run from any directory
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+SAMPLE_INPUT = {
+    'symptoms': "Throbbing headache on the right side with nausea and sensitivity to light",
+    'duration': "2 days",
+    'severity': "Moderate",
+    'location': "Right temple",
+    'onset': "Gradual",
+    'age': 34,
+    'gender': "Female",
+    'medical_history': "Mild asthma",
+    'medications': "Salbutamol inhaler as needed",
+    'allergies': "Penicillin",
+    'lifestyle': "Vegetarian, desk job, little exercise"
+}
+
+
+def percentile(samples, pct):
+    """Return the pct percentile of samples using nearest-rank"""
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[rank]
+
+
+def summarize(samples):
+    """Return count, mean and percentile latencies in milliseconds, plus throughput"""
+    total = sum(samples)
+    return {
+        'count': len(samples),
+        'mean_ms': 1000 * total / len(samples) if samples else 0.0,
+        'p50_ms': 1000 * percentile(samples, 50),
+        'p95_ms': 1000 * percentile(samples, 95),
+        'p99_ms': 1000 * percentile(samples, 99),
+        'ops_per_s': len(samples) / total if total else 0.0,
+    }
+
+
+def print_table(results, columns=('count', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'ops_per_s')):
+    """Print {name: summary} results as an aligned table"""
+    width = max(len(name) for name in results) + 2
+    print("stage".ljust(width) + "".join(column.rjust(12) for column in columns))
+    for name, summary in results.items():
+        cells = "".join(
+            f"{summary[column]:12.3f}" if isinstance(summary[column], float) else f"{summary[column]:12}"
+            for column in columns
+        )
+        print(name.ljust(width) + cells)
+
+
+def compare_to_baseline(results, baseline_path, tolerance, metric='p95_ms'):
+    """Return the names of stages whose metric is worse than the baseline by more than tolerance"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    regressions = []
+    for name, summary in results.items():
+        previous = baseline.get(name, {}).get(metric)
+        if previous and summary[metric] > previous * (1 + tolerance):
+            regressions.append(f"{name}: {metric} {previous:.3f} -> {summary[metric]:.3f}")
+    return regressions
@@ -0,0 +1,228 @@
+"""Caches shared by the app's external lookups"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Returned by get() when a key is absent or expired, since None is a valid cached value
+MISSING = object()
+
+CACHE_DIR = os.getenv("CACHE_DIR", ".cache")
+
+
+class SQLiteCache:
+    """Disk-backed cache with TTL expiry, an LRU size limit and hit/miss counters
+
+    Values must be JSON serializable. None is cached as a negative result and
+    expires after negative_ttl, so lookups that found nothing are retried sooner.
+    """
+
+    def __init__(self, name, ttl=86400, negative_ttl=3600, max_entries=5000, path=None):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.path = path or os.path.join(CACHE_DIR, f"{name}.sqlite3")
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value TEXT, expires_at REAL, last_access REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+
+    def get(self, key, default=MISSING):
+        """Return the cached value for key, or default if it is missing or expired"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] <= now:
+                if row is not None:
+                    self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self.misses += 1
+                return default
+
+            self._conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+            value = json.loads(row[0])
+            if value is None:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Store value under key, evicting the least recently used entries when full"""
+        if ttl is None:
+            ttl = self.negative_ttl if value is None else self.ttl
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now + ttl, now),
+            )
+            self._evict(now)
+
+    def _evict(self, now):
+        """Drop expired entries, then the least recently used ones above max_entries"""
+        removed = self._conn.execute("DELETE FROM entries WHERE expires_at <= ?", (now,)).rowcount
+        count = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        if count > self.max_entries:
+            removed += self._conn.execute(
+                "DELETE FROM entries WHERE key IN "
+                "(SELECT key FROM entries ORDER BY last_access LIMIT ?)",
+                (count - self.max_entries,),
+            ).rowcount
+        self.evictions += removed
+
+    def clear(self):
+        """Remove every entry"""
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+
+    def stats(self):
+        """Return hit/miss counters and the current number of entries"""
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return {
+            'hits': self.hits,
+            'negative_hits': self.negative_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': size,
+        }
+
+
+class MemoryCache:
+    """In-process cache with the same interface and eviction rules as SQLiteCache"""
+
+    def __init__(self, name, ttl=86400, negative_ttl=3600, max_entries=5000):
+        self.name = name
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=MISSING):
+        """Return the cached value for key, or default if it is missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.time():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            if entry[0] is None:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        """Store value under key, evicting the least recently used entries when full"""
+        if ttl is None:
+            ttl = self.negative_ttl if value is None else self.ttl
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Remove every entry"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return hit/miss counters and the current number of entries"""
+        with self._lock:
+            size = len(self._entries)
+        return {
+            'hits': self.hits,
+            'negative_hits': self.negative_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': size,
+        }
+
+
+class InFlightLookups:
+    """Runs lookups on a bounded pool of threads, so callers asking for the same key share one run
+
+    A lookup started ahead of time, such as a prefetch, is joined by later
+    callers for the same key instead of being repeated. Once it finishes the
+    key is forgotten, and its results are expected in a cache.
+    """
+
+    def __init__(self, name, max_workers=4):
+        self.name = name
+        self.started = 0
+        self.joined = 0
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+
+    def submit(self, key, function, *args, **kwargs):
+        """Return the future of the lookup running for key, starting function(*args, **kwargs) if there is none"""
+        with self._lock:
+            future = self._futures.get(key)
+            if future is not None:
+                self.joined += 1
+                return future
+            future = self._executor.submit(function, *args, **kwargs)
+            self._futures[key] = future
+            self.started += 1
+        future.add_done_callback(lambda _: self._forget(key, future))
+        return future
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._futures.get(key) is future:
+                del self._futures[key]
+
+    def stats(self):
+        """Return the lookups started and joined, and how many are running or queued"""
+        with self._lock:
+            return {'started': self.started, 'joined': self.joined, 'in_flight': len(self._futures)}
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def shared_cache(name, factory=SQLiteCache, **kwargs):
+    """Return the process-wide cache called name, creating it on first use
+
+    Streamlit re-executes main.py on every rerun, so caches are kept here
+    to survive reruns and be shared between sessions.
+    """
+    with _shared_lock:
+        if name not in _shared:
+            _shared[name] = factory(name, **kwargs)
+        return _shared[name]
+
+
+def cache_stats():
+    """Return the counters of every shared cache, keyed by cache name"""
+    with _shared_lock:
+        caches = dict(_shared)
+    return {name: cache.stats() for name, cache in caches.items()}
@@ -0,0 +1,60 @@
+"""API clients created on first use and shared by every session in the process
+
+Streamlit reruns the whole script on every interaction, so clients built in
+main() would be rebuilt each time. These factories build each client once,
+importing its library only when the feature is first used, with the
+service's timeouts from outbound where the client accepts them.
+"""
+import os
+from functools import lru_cache
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from outbound import SERVICE_LIMITS
+
+# Keep-alive connections kept open per host by the shared HTTP session
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))
+
+
+@lru_cache(maxsize=None)
+def http_session():
+    """Return the pooled keep-alive HTTP session shared by the API clients"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def maps_configured():
+    """Check whether a Google Maps API key is set, without importing the client library"""
+    return bool(os.getenv("GOOGLE_MAPS_API_KEY"))
+
+
+@lru_cache(maxsize=None)
+def maps_client():
+    """Return the Google Maps client, or None when no API key is set"""
+    if not maps_configured():
+        return None
+    import googlemaps
+
+    limits = SERVICE_LIMITS['maps']
+    return googlemaps.Client(key=os.getenv("GOOGLE_MAPS_API_KEY"), requests_session=http_session(),
+                             connect_timeout=limits.connect, read_timeout=limits.read,
+                             retry_timeout=limits.deadline)
+
+
+def firecrawl_configured():
+    """Check whether a Firecrawl API key is set, without importing the client library"""
+    return bool(os.getenv("FIRECRAWL_API_KEY"))
+
+
+@lru_cache(maxsize=None)
+def firecrawl_client():
+    """Return the Firecrawl client, or None when no API key is set"""
+    if not firecrawl_configured():
+        return None
+    from firecrawl import FirecrawlApp
+
+    return FirecrawlApp(api_key=os.getenv("FIRECRAWL_API_KEY"))
@@ -0,0 +1,279 @@
+"""Offline index of medical facilities for nearest and radius queries without network calls
+
+Facilities are bulk loaded from a CSV (name, lat, lng, type, address, phone)
+or an OpenStreetMap XML extract, and kept in a KD-tree over points on the
+unit sphere, where straight-line distance orders points the same way as
+distance along the Earth's surface. A small gazetteer of localities lets
+common place names be located without geocoding.
+"""
+import csv
+import heapq
+import math
+import os
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+from functools import lru_cache
+
+from geo import chord_to_meters, haversine_m, meters_to_chord, unit_vector
+from tracing import span
+
+_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+# Facility sources: comma-separated CSV files or OpenStreetMap .osm extracts
+FACILITY_INDEX_PATHS = os.getenv("FACILITY_INDEX_PATHS", os.path.join(_DATA_DIR, "facilities.csv"))
+LOCALITIES_PATH = os.getenv("LOCALITIES_PATH", os.path.join(_DATA_DIR, "localities.csv"))
+
+# OpenStreetMap tags that mark a place where patients can get care
+OSM_FACILITY_TAGS = {
+    'amenity': {'hospital', 'clinic', 'doctors'},
+    'healthcare': {'hospital', 'clinic', 'doctor', 'centre'},
+}
+
+Facility = namedtuple("Facility", "id name lat lng kind address phone")
+
+
+def normalize_place(text):
+    return " ".join(str(text).lower().replace(",", " ").split())
+
+
+class KDTree:
+    """Static KD-tree over 3D points, built once by median splits"""
+
+    def __init__(self, points):
+        # Each node is (point, index, axis, left, right)
+        self.root = self._build(list(enumerate(points)), 0)
+
+    def _build(self, items, depth):
+        if not items:
+            return None
+        axis = depth % 3
+        items.sort(key=lambda item: item[1][axis])
+        middle = len(items) // 2
+        index, point = items[middle]
+        return (point, index, axis,
+                self._build(items[:middle], depth + 1), self._build(items[middle + 1:], depth + 1))
+
+    def nearest(self, target, k, max_distance=math.inf):
+        """Return up to k (distance, index) pairs within max_distance of target, closest first"""
+        best = []  # Max-heap of (-distance, index)
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            point, index, axis, left, right = node
+            distance = math.dist(point, target)
+            if distance <= max_distance:
+                if len(best) < k:
+                    heapq.heappush(best, (-distance, index))
+                elif distance < -best[0][0]:
+                    heapq.heapreplace(best, (-distance, index))
+            offset = target[axis] - point[axis]
+            near, far = (left, right) if offset < 0 else (right, left)
+            bound = -best[0][0] if len(best) == k else max_distance
+            if abs(offset) <= bound:
+                stack.append(far)
+            stack.append(near)  # Searched first, so the far side is often pruned
+        return sorted((-negative, index) for negative, index in best)
+
+    def within(self, target, max_distance):
+        """Return every (distance, index) pair within max_distance of target, closest first"""
+        found = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            point, index, axis, left, right = node
+            distance = math.dist(point, target)
+            if distance <= max_distance:
+                found.append((distance, index))
+            offset = target[axis] - point[axis]
+            if offset - max_distance <= 0:
+                stack.append(left)
+            if offset + max_distance >= 0:
+                stack.append(right)
+        return sorted(found)
+
+
+class FacilityIndex:
+    """Nearest-facility lookups over facilities loaded in bulk from CSV or OSM files"""
+
+    def __init__(self, facilities=()):
+        self.facilities = list(facilities)
+        self.tree = KDTree([unit_vector(f.lat, f.lng) for f in self.facilities])
+
+    @classmethod
+    def from_files(cls, paths):
+        """Build an index from every CSV or .osm file in paths, skipping missing ones"""
+        facilities = []
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            loader = load_osm if path.lower().endswith(".osm") else load_csv
+            facilities.extend(loader(path))
+        return cls(facilities)
+
+    def __len__(self):
+        return len(self.facilities)
+
+    def nearest(self, lat, lng, k=10, radius=None):
+        """Return up to k (meters, Facility) pairs closest to lat/lng, within radius meters if given"""
+        if not self.facilities or k <= 0:
+            return []
+        max_distance = math.inf if radius is None else meters_to_chord(radius)
+        with span("facility_index.nearest", k=k) as record:
+            pairs = self.tree.nearest(unit_vector(lat, lng), k, max_distance)
+            record['results'] = len(pairs)
+        return [(chord_to_meters(distance), self.facilities[index]) for distance, index in pairs]
+
+    def within(self, lat, lng, radius):
+        """Return every (meters, Facility) pair within radius meters of lat/lng, closest first"""
+        if not self.facilities:
+            return []
+        with span("facility_index.within", radius=radius) as record:
+            pairs = self.tree.within(unit_vector(lat, lng), meters_to_chord(radius))
+            record['results'] = len(pairs)
+        return [(chord_to_meters(distance), self.facilities[index]) for distance, index in pairs]
+
+
+def load_csv(path):
+    """Read facilities from a CSV with name, lat and lng columns and optional type, address and phone"""
+    facilities = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row_number, row in enumerate(csv.DictReader(f), 1):
+            try:
+                lat, lng = float(row['lat']), float(row['lng'])
+            except (KeyError, TypeError, ValueError):
+                continue
+            facilities.append(Facility(
+                id=row.get('id') or f"{os.path.basename(path)}:{row_number}",
+                name=(row.get('name') or "Medical Facility").strip(),
+                lat=lat, lng=lng,
+                kind=(row.get('type') or "hospital").strip(),
+                address=(row.get('address') or "").strip(),
+                phone=(row.get('phone') or "").strip(),
+            ))
+    return facilities
+
+
+def osm_facility_kind(tags):
+    for key, values in OSM_FACILITY_TAGS.items():
+        if tags.get(key) in values:
+            return tags[key]
+    return None
+
+
+def load_osm(path):
+    """Read hospitals, clinics and doctors from an OpenStreetMap XML extract
+
+    Ways are placed at the average of their nodes, so node coordinates are
+    kept while the file is read; extracts are expected to cover a region.
+    """
+    facilities, coordinates = [], {}
+    for _, element in ET.iterparse(path, events=("end",)):
+        if element.tag not in ("node", "way"):
+            continue
+        tags = {tag.get('k'): tag.get('v') for tag in element.iter("tag")}
+        if element.tag == "node":
+            lat, lng = float(element.get('lat')), float(element.get('lon'))
+            coordinates[element.get('id')] = (lat, lng)
+        else:
+            points = [coordinates[nd.get('ref')] for nd in element.iter("nd") if nd.get('ref') in coordinates]
+            if not points:
+                element.clear()
+                continue
+            lat = sum(point[0] for point in points) / len(points)
+            lng = sum(point[1] for point in points) / len(points)
+        kind = osm_facility_kind(tags)
+        if kind:
+            address = ", ".join(tags[key] for key in ("addr:housenumber", "addr:street", "addr:city") if tags.get(key))
+            facilities.append(Facility(
+                id=f"osm:{element.tag}/{element.get('id')}",
+                name=tags.get('name') or tags.get('name:en') or "Medical Facility",
+                lat=lat, lng=lng, kind=kind, address=address,
+                phone=tags.get('phone') or tags.get('contact:phone') or "",
+            ))
+        element.clear()
+    return facilities
+
+
+def load_localities(path):
+    """Read place names and their coordinates, keyed by normalized name and alias"""
+    localities = {}
+    if not os.path.exists(path):
+        return localities
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            coordinates = {'lat': float(row['lat']), 'lng': float(row['lng'])}
+            for name in [row['name'], *(row.get('aliases') or "").split("|")]:
+                if name.strip():
+                    localities.setdefault(normalize_place(name), coordinates)
+    return localities
+
+
+@lru_cache(maxsize=None)
+def facility_index():
+    """Return the process-wide facility index, loading its files on first use"""
+    paths = [path.strip() for path in FACILITY_INDEX_PATHS.split(",") if path.strip()]
+    with span("facility_index.load"):
+        return FacilityIndex.from_files(paths)
+
+
+@lru_cache(maxsize=None)
+def localities():
+    return load_localities(LOCALITIES_PATH)
+
+
+def parse_coordinates(text):
+    """Read "lat, lng" typed as a location, or return None"""
+    parts = str(text).replace(",", " ").split()
+    if len(parts) != 2:
+        return None
+    try:
+        lat, lng = float(parts[0]), float(parts[1])
+    except ValueError:
+        return None
+    return {'lat': lat, 'lng': lng} if -90 <= lat <= 90 and -180 <= lng <= 180 else None
+
+
+def locate_offline(location, exact=True):
+    """Find coordinates for location text without a network call, or return None
+
+    Exact matching accepts typed coordinates or a known place name; otherwise
+    any known place named in the text is used, such as the city in an address.
+    """
+    coordinates = parse_coordinates(location)
+    if coordinates:
+        return coordinates
+    text = normalize_place(location)
+    known = localities()
+    if text in known:
+        return known[text]
+    if exact:
+        return None
+    padded = f" {text} "
+    # Prefer the longest name, so "new delhi" wins over "delhi"
+    for name in sorted(known, key=len, reverse=True):
+        if f" {name} " in padded:
+            return known[name]
+    return None
+
+
+def facility_place(facility, meters):
+    """Describe a facility the way a Google Places result does, with its distance"""
+    return {
+        'place_id': facility.id,
+        'name': facility.name,
+        'vicinity': facility.address or 'Address not available',
+        'geometry': {'location': {'lat': facility.lat, 'lng': facility.lng}},
+        'types': [facility.kind],
+        'formatted_phone_number': facility.phone,
+        'distance_m': round(meters),
+        'source': 'local',
+    }
+
+
+def place_distance(place, coordinates):
+    location = place['geometry']['location']
+    return haversine_m(coordinates['lat'], coordinates['lng'], location['lat'], location['lng'])
@@ -0,0 +1,135 @@
+"""Image preprocessing before analysis: orientation, downscaling, re-encoding and hashing"""
+import hashlib
+import io
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from PIL import Image, ImageOps
+
+from cache import MISSING
+
+# Longest image edge sent to the model, in pixels
+IMAGE_MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", "1024"))
+# Format and quality used to re-encode uploads: JPEG or WEBP
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "JPEG").upper()
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "85"))
+
+PreprocessedImage = namedtuple("PreprocessedImage", "data mime_type width height phash digest")
+
+
+def preprocess_image(uploaded_file, max_edge=IMAGE_MAX_EDGE, image_format=IMAGE_FORMAT, quality=IMAGE_QUALITY):
+    """Orient, downscale and re-encode an uploaded image, returning a PreprocessedImage"""
+    source = uploaded_file.getvalue() if hasattr(uploaded_file, "getvalue") else uploaded_file
+    image = Image.open(io.BytesIO(source))
+
+    # Let the JPEG decoder skip detail we would throw away when downscaling
+    image.draft("RGB", (max_edge, max_edge))
+    image = ImageOps.exif_transpose(image)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+    output = io.BytesIO()
+    image.save(output, format=image_format, quality=quality, optimize=True)
+    return PreprocessedImage(
+        data=output.getvalue(),
+        mime_type=f"image/{image_format.lower()}",
+        width=image.width,
+        height=image.height,
+        phash=perceptual_hash(image),
+        digest=hashlib.sha256(source).hexdigest(),
+    )
+
+
+def perceptual_hash(image, hash_size=8):
+    """Return a 64-bit difference hash that stays stable across resizing and re-encoding"""
+    pixels = list(image.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS).getdata())
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def hamming_distance(a, b):
+    """Count the bits that differ between two perceptual hashes"""
+    return bin(a ^ b).count("1")
+
+
+def image_blob(image):
+    """Return a PreprocessedImage as an inline blob the Gemini SDK accepts"""
+    return {'mime_type': image.mime_type, 'data': image.data}
+
+
+class PerceptualHashCache:
+    """Cache keyed by image content that also answers for near-duplicate images uploaded in the same scope
+
+    Clinically different photos can have hashes a few bits apart, so a near
+    match is only reused within one scope, such as one user's session. Other
+    scopes get a value only for the exact same image content.
+    """
+
+    def __init__(self, name, ttl=86400, max_entries=256, max_distance=4):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # Content digest to (phash, scope, value, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, digest, phash, scope=None, default=MISSING):
+        """Return the value stored for digest, or for the closest hash within max_distance stored in scope"""
+        now = time.time()
+        with self._lock:
+            best_key, best_distance = None, self.max_distance + 1
+            for key, (key_phash, key_scope, value, expires_at) in list(self._entries.items()):
+                if expires_at <= now:
+                    del self._entries[key]
+                    continue
+                if key == digest:
+                    best_key, best_distance = key, 0
+                    break
+                if scope is not None and key_scope == scope:
+                    distance = hamming_distance(key_phash, phash)
+                    if distance < best_distance:
+                        best_key, best_distance = key, distance
+
+            if best_key is None:
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(best_key)
+            if best_key == digest:
+                self.hits += 1
+            else:
+                self.near_hits += 1
+            return self._entries[best_key][2]
+
+    def set(self, digest, phash, value, scope=None):
+        """Store value for an image in scope, evicting the least recently used entries when full"""
+        with self._lock:
+            self._entries[digest] = (phash, scope, value, time.time() + self.ttl)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        """Return hit/miss counters and the current number of entries"""
+        with self._lock:
+            size = len(self._entries)
+        return {
+            'hits': self.hits,
+            'near_hits': self.near_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': size,
+        }
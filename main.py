@@ -1,183 +1,278 @@
 import streamlit as st
-import google.generativeai as genai
+import streamlit.components.v1 as components
 from dotenv import load_dotenv
 import os
-import re
-from gtts import gTTS
-import base64
-import tempfile
-from PIL import Image
-import googlemaps
-from fpdf import FPDF
-import re
-from firecrawl import FirecrawlApp  # New import for Firecrawl
+import hashlib
+from urllib.parse import quote, quote_plus
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FutureTimeout
+from cache import MISSING, InFlightLookups, cache_stats, shared_cache
+import outbound
+from clients import firecrawl_client, firecrawl_configured, maps_client, maps_configured
+from facility_index import facility_index, facility_place, locate_offline, place_distance
+from geo import geohash_center, geohash_encode
+from image_preprocessing import preprocess_image
+from medication_catalog import medication_catalog
+from tts_engine import synthesize, synthesize_stream
+from red_flags import pre_triage
+from report import report_pdf
+from scheduler import ASSESSMENT, EMERGENCY, scheduler
+from tracing import span, start_metrics_server, tracer
+from triage import (ASSESSMENT_PIPELINE, NUTRITION_PREFETCH, OUTPUT_FORMAT, PIPELINE_MODES, RESPONSE_CACHE_BYPASS,
+                    detect_urgency, format_pipeline_report, generate_nutrition_recommendations,
+                    is_error_response, parse_assessment, prefetch_nutrition_recommendations,
+                    render_assessment_html, run_assessment_pipeline)
 
 # Load environment variables
 load_dotenv()
 
-# Configure Gemini API
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-model = genai.GenerativeModel('gemini-1.5-flash')
+# Maximum number of pharmacy searches run at the same time
+MEDICATION_SEARCH_WORKERS = int(os.getenv("MEDICATION_SEARCH_WORKERS", "8"))
 
-# Configure Firecrawl
-firecrawl_api_key = os.getenv("FIRECRAWL_API_KEY")
-firecrawl_app = FirecrawlApp(api_key=firecrawl_api_key) if firecrawl_api_key else None
+# Cache pharmacy search results on disk, shared by all sessions
+medication_search_cache = shared_cache(
+    "medication_search",
+    ttl=int(os.getenv("MEDICATION_SEARCH_CACHE_TTL", "604800")),  # 7 days
+    negative_ttl=int(os.getenv("MEDICATION_SEARCH_NEGATIVE_TTL", "3600")),
+    max_entries=int(os.getenv("MEDICATION_SEARCH_CACHE_SIZE", "2000"))
+)
 
-def analyze_image(uploaded_file):
-    """Analyze uploaded image for medical symptoms"""
-    try:
-        image = Image.open(uploaded_file)
-        response = model.generate_content(["Analyze this medical image for symptoms, possible conditions, and urgency level. Focus on visible symptoms like rashes, wounds, swelling, or discoloration. Provide recommendations similar to the text analysis format.", image])
-        return response.text
-    except Exception as e:
-        return f"Error analyzing image: {str(e)}"
-
-def generate_response(user_input, language, image_analysis=None):
-    """Generate health assessment using Gemini with image analysis"""
-    language_instruction = {
-        "English": "Provide all recommendations in English.",
-        "Hindi": "Provide all recommendations in Hindi (हिंदी में).",
-        "Telugu": "Provide all recommendations in Telugu (తెలుగులో)."
-    }.get(language, "Provide all recommendations in English.")
-    
-    patient_info = f"""
-Patient Information:
-- Symptoms: {user_input.get('symptoms', 'Not specified')}
-- Duration: {user_input.get('duration', 'Not specified')}
-- Severity: {user_input.get('severity', 'Not specified')}
-- Location: {user_input.get('location', 'Not specified')}
-- Onset: {user_input.get('onset', 'Not specified')}
-- Age: {user_input.get('age', 'Not specified')}
-- Gender: {user_input.get('gender', 'Not specified')}
-- Medical History: {user_input.get('medical_history', 'Not specified')}
-- Current Medications: {user_input.get('medications', 'Not specified')}
-- Allergies: {user_input.get('allergies', 'Not specified')}
-- Lifestyle: {user_input.get('lifestyle', 'Not specified')}
-"""
-    
-    visual_analysis = f"\n\nAdditional Visual Symptom Analysis:\n{image_analysis}" if image_analysis else ""
-    
-    prompt = f"""You are an AI Health Assistant. Analyze the following patient information and provide detailed recommendations:
-
-1. Possible conditions (list 3-5 most likely, ordered by probability)
-2. Urgency level (emergency, seek care soon, self-care)
-3. Recommended next steps (when to see a doctor, self-care tips)
-4. Any red flag symptoms to watch for
-5. SPECIFIC MEDICATION RECOMMENDATIONS (both prescription and OTC options)
-
-MEDICATION GUIDELINES:
-- For common/minor issues: Suggest specific OTC medications with standard dosages
-- For serious conditions: State that prescription medications are needed and list common options doctors might prescribe
-- Always consider the patient's current medications and allergies
-- Include both generic and brand names when available
-- Provide standard adult dosages (unless pediatric case)
-- Highlight important warnings (allergies, interactions, side effects)
-- Still recommend doctor consultation for proper diagnosis
-
-IMPORTANT FORMATTING:
-- Urgency level must use exactly:
-  * "Urgency Level: Emergency" (red)
-  * "Urgency Level: Seek care soon" (orange)
-  * "Urgency Level: Self-care" (green)
-
-- Medication section must begin with: "### Medication Recommendations:"
-
-{language_instruction}
-
-{patient_info}
-{visual_analysis}
-
-Provide clear, actionable recommendations while emphasizing safety.
-"""
-    try:
-        response = model.generate_content(prompt)
-        return response.text
-    except Exception as e:
-        return f"Error generating response: {str(e)}"
-    
-def color_urgency_level(text):
-    """Add color to the urgency level in the response text"""
-    if "Urgency Level: Emergency" in text:
-        return re.sub(
-            r"Urgency Level: Emergency", 
-            r'<span style="color:red; font-weight:bold">Urgency Level: Emergency</span>', 
-            text
-        )
-    elif "Urgency Level: Seek care soon" in text:
-        return re.sub(
-            r"Urgency Level: Seek care soon", 
-            r'<span style="color:orange; font-weight:bold">Urgency Level: Seek care soon</span>', 
-            text
-        )
-    elif "Urgency Level: Self-care" in text:
-        return re.sub(
-            r"Urgency Level: Self-care", 
-            r'<span style="color:green; font-weight:bold">Urgency Level: Self-care</span>', 
-            text
-        )
-    return text
+# Cache geocoding by location text and facility searches by geohash cell
+geocode_cache = shared_cache(
+    "geocode",
+    ttl=int(os.getenv("GEOCODE_CACHE_TTL", "2592000")),  # 30 days
+    negative_ttl=int(os.getenv("GEOCODE_NEGATIVE_TTL", "3600")),
+    max_entries=int(os.getenv("GEOCODE_CACHE_SIZE", "5000"))
+)
+facility_cache = shared_cache(
+    "facilities",
+    ttl=int(os.getenv("FACILITY_CACHE_TTL", "86400")),  # 1 day
+    negative_ttl=int(os.getenv("FACILITY_NEGATIVE_TTL", "900")),
+    max_entries=int(os.getenv("FACILITY_CACHE_SIZE", "5000"))
+)
+# Geohash length used to bucket users; 6 characters is a cell of about 1.2km x 0.6km
+FACILITY_GEOHASH_PRECISION = int(os.getenv("FACILITY_GEOHASH_PRECISION", "6"))
+# Facilities shown per search
+FACILITY_RESULTS = int(os.getenv("FACILITY_RESULTS", "20"))
+# Google results this close to a local facility are taken to be the same place
+FACILITY_DUPLICATE_METERS = 100
+# Seconds the local facilities wait for Google Maps results before they are shown without them
+FACILITY_LIVE_WAIT = float(os.getenv("FACILITY_LIVE_WAIT", "1.0"))
+# Google Maps facility lookups, started while an emergency assessment is still being generated and
+# joined by the search for the same location instead of being repeated
+facility_lookups = shared_cache(
+    "facility_lookups",
+    factory=InFlightLookups,
+    max_workers=int(os.getenv("FACILITY_PREFETCH_WORKERS", "4"))
+)
+
+# Photos kept per submission; only their downscaled copies are held in session state
+MAX_UPLOAD_IMAGES = int(os.getenv("MAX_UPLOAD_IMAGES", "4"))
 
-def enhance_medication_display(text):
-    """Improve the display of medication information"""
-    # Highlight section header
-    text = re.sub(r"### Medication Recommendations:", 
-                 r'<h4 style="color:#2b5876; margin-top:20px">💊 Medication Recommendations:</h4>', 
-                 text)
+# Render assessments token by token as Gemini generates them
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "true").lower() in ("1", "true", "yes")
+
+# Expose span metrics for Prometheus scraping, and show them in the sidebar by default
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+DEBUG_PANEL = os.getenv("DEBUG_PANEL", "false").lower() in ("1", "true", "yes")
+if METRICS_PORT:
+    start_metrics_server(METRICS_PORT)
+
+def memoized_render(section, key, render):
+    """Return render() for a results section, reusing its output from earlier reruns while key is unchanged"""
+    rendered = st.session_state.response_data.setdefault('rendered', {})
+    entry = rendered.get(section)
+    if entry is not None and entry[0] == key:
+        return entry[1]
     
-    # Highlight medication names
-    text = re.sub(r"(?i)(\b(?:paracetamol|acetaminophen|ibuprofen|aspirin|omeprazole|loratadine|diphenhydramine|ranitidine|pepto-bismol)\b)", 
-                 r'<span style="background-color:#979291; padding:2px 5px; border-radius:4px; border:1px solid #cce0ff">\1</span>', 
-                 text)
+    value = render()
+    if value is not None:  # Failed renders are retried on the next rerun
+        rendered[section] = (key, value)
+    return value
+
+def show_emergency_alert(reason=None):
+    """Warn that emergency care may be needed and list the emergency numbers"""
+    cause = f"{reason}: your" if reason else "Your"
+    st.error(f"🆘 {cause} symptoms may need emergency care. Please contact emergency services now.")
+    show_emergency_contacts()
+
+def stream_assessment(chunks, gmaps_client=None, emergency_location=None, urgency=None):
+    """Render a streamed assessment as it arrives, starting emergency help as soon as it is flagged
     
-    # Highlight dosage information
-    text = re.sub(r"(\d+\s?mg|\d+\s?times per day|\d+\s?hours)", 
-                 r'<span style="font-weight:bold; color:#0066cc">\1</span>', 
-                 text)
+    An urgency that is already known, such as from a local red flag, skips the detection.
+    """
+    emergency_panel = st.empty()
+    output = st.empty()
+    text = ""
     
+    for chunk in chunks:
+        if is_error_response(chunk):
+            text = chunk  # A failure part way through replaces the partial answer rather than trailing it
+            break
+        scanned = len(text)
+        text += chunk
+        output.markdown(text + " ▌")
+        
+        if urgency is None:
+            urgency = detect_urgency(text, scanned)
+            if urgency == "Emergency":
+                with emergency_panel.container():
+                    show_emergency_alert()
+                # Warm the facility caches while the rest of the answer streams in
+                if gmaps_client and emergency_location:
+                    prefetch_facilities(gmaps_client, emergency_location)
+    
+    # The full results section takes over once the answer is complete
+    output.empty()
+    emergency_panel.empty()
     return text
 
+def prefetch_facilities(gmaps_client, location, radius=5000):
+    """Start locating location and the Google Maps facility search around it without waiting for either
+    
+    Failures are recorded as errors of the maps.geocode and maps.places_nearby spans.
+    """
+    def search(located):
+        if located.exception() is None and located.result():
+            live_facilities(gmaps_client, located.result(), radius)
+    live_location(gmaps_client, location).add_done_callback(search)
+
+def live_location(gmaps_client, location):
+    """Return the future of locating location, joining one already running"""
+    return facility_lookups.submit(('locate', normalize_location(location)), locate, gmaps_client, location)
+
+def live_facilities(gmaps_client, location_coords, radius):
+    """Return the future of the Google Maps facility search around coordinates, joining one already running"""
+    return facility_lookups.submit(('places', facility_cell(location_coords), radius), find_facilities_near,
+                                   gmaps_client, location_coords, radius)
+
+def fetch_nearby_medical_facilities(gmaps_client, location, radius=5000):
+    """Look up nearby hospitals and clinics in the local index, adding Google Maps results when it is configured
+    
+    Live results win over local entries for the same place, since the local list may be out of date. When the
+    local index has facilities, they are shown after FACILITY_LIVE_WAIT seconds at most, marked live_pending
+    if Google has not answered yet; its results are cached for the next search. The local index alone answers
+    without an API key or when the API fails; API errors are raised only when it has nothing to show.
+    """
+    location_coords = locate_offline(location)
+    if not location_coords:
+        # Geocoding is the one Google call waited on in full, joining one a prefetch started
+        location_coords = (live_location(gmaps_client, location).result() if gmaps_client is not None
+                           else locate(None, location))
+    if not location_coords:
+        return None
+    live = live_facilities(gmaps_client, location_coords, radius) if gmaps_client is not None else None
+    
+    nearest = facility_index().nearest(location_coords['lat'], location_coords['lng'],
+                                       k=FACILITY_RESULTS, radius=radius)
+    places = [facility_place(facility, meters) for meters, facility in nearest]
+    live_pending = False
+    if live is not None:
+        try:
+            places = merge_facilities(live.result(timeout=FACILITY_LIVE_WAIT if places else None), places,
+                                      location_coords)
+        except FutureTimeout:
+            live_pending = True
+        except Exception:
+            if not places:
+                raise
+    
+    return {
+        'coordinates': location_coords,
+        'places': places,
+        'live_pending': live_pending
+    }
+
+def merge_facilities(places, other_places, location_coords):
+    """List places, then the other places not already listed, closest first"""
+    merged = []
+    for place in [*places, *other_places]:
+        if any(place_distance(place, known['geometry']['location']) < FACILITY_DUPLICATE_METERS for known in merged):
+            continue
+        merged.append({**place, 'distance_m': round(place_distance(place, location_coords))})
+    merged.sort(key=lambda place: place['distance_m'])
+    return merged[:FACILITY_RESULTS]
+
 def get_nearby_medical_facilities(gmaps_client, location, radius=5000):
-    """Get nearby hospitals and clinics using Google Maps API"""
+    """Get nearby hospitals and clinics from the local index and Google Maps API"""
     try:
-        if not location or gmaps_client is None:
+        if not location:
             return None
-                
-        geocode_result = gmaps_client.geocode(location)
-        if not geocode_result:
-            return None
-            
-        location_coords = geocode_result[0]['geometry']['location']
-        
-        places_result = gmaps_client.places_nearby(
-            location=location_coords,
-            radius=radius,
-            type='hospital|clinic|doctor',
-            keyword='emergency'
-        )
         
-        return {
-            'coordinates': location_coords,
-            'places': places_result.get('results', [])
-        }
+        return fetch_nearby_medical_facilities(gmaps_client, location, radius)
     except Exception as e:
         st.error(f"Error fetching medical facilities: {str(e)}")
         return None
 
-def show_medical_facilities_map(medical_data):
-    """Display nearby medical facilities on a map"""
-    if not medical_data or not medical_data.get('places'):
-        st.warning("No nearby medical facilities found")
-        return
+def normalize_location(location):
+    """Normalize location text for use as a cache key"""
+    return " ".join(location.lower().replace(",", " ").split())
+
+def locate(gmaps_client, location):
+    """Find coordinates for location text, geocoding only what cannot be resolved offline"""
+    location_coords = locate_offline(location)
+    if location_coords:
+        return location_coords
     
-    coordinates = medical_data['coordinates']
-    places = medical_data['places']
+    if gmaps_client is not None:
+        try:
+            location_coords = geocode_location(gmaps_client, location)
+        except Exception:
+            # A city named in the text is better than no help at all
+            location_coords = locate_offline(location, exact=False)
+            if not location_coords:
+                raise
+        if location_coords:
+            return location_coords
+    return locate_offline(location, exact=False)
+
+def geocode_location(gmaps_client, location):
+    """Geocode location text to coordinates, using the geocode cache"""
+    cache_key = normalize_location(location)
+    location_coords = geocode_cache.get(cache_key)
+    if location_coords is not MISSING:
+        return location_coords
     
+    with span("maps.geocode"):
+        geocode_result = outbound.call('maps', gmaps_client.geocode, location)
+    location_coords = geocode_result[0]['geometry']['location'] if geocode_result else None
+    geocode_cache.set(cache_key, location_coords)
+    return location_coords
+
+def facility_cell(location_coords):
+    """Return the geohash cell whose facility search serves coordinates"""
+    return geohash_encode(location_coords['lat'], location_coords['lng'], FACILITY_GEOHASH_PRECISION)
+
+def find_facilities_near(gmaps_client, location_coords, radius):
+    """Find medical facilities around coordinates, shared by everyone in the same geohash cell"""
+    cell = facility_cell(location_coords)
+    cache_key = f"{cell}:{radius}"
+    places = facility_cache.get(cache_key)
+    if places is not MISSING:
+        return places or []
+    
+    # Search around the cell center so the cached result fits every user in the cell
+    center_lat, center_lng = geohash_center(cell)
+    with span("maps.places_nearby", radius=radius) as record:
+        places_result = outbound.call(
+            'maps', gmaps_client.places_nearby,
+            location={'lat': center_lat, 'lng': center_lng},
+            radius=radius,
+            type='hospital|clinic|doctor',
+            keyword='emergency'
+        )
+        places = places_result.get('results', [])
+        record['results'] = len(places)
+    facility_cache.set(cache_key, places or None)
+    return places
+
+def render_facilities_map(coordinates, places):
+    """Render the facilities map to standalone HTML"""
     import folium
-    from streamlit_folium import folium_static
     
     m = folium.Map(location=[coordinates['lat'], coordinates['lng']], zoom_start=13)
     
-    for place in places[:10]:
+    for place in places:
         folium.Marker(
             location=[place['geometry']['location']['lat'], 
             place['geometry']['location']['lng']],
@@ -187,132 +282,157 @@ def show_medical_facilities_map(medical_data):
             icon=folium.Icon(color='red', icon='plus-sign')
         ).add_to(m)
     
-    folium_static(m)
+    return folium.Figure().add_child(m).render()
+
+def show_medical_facilities_map(medical_data):
+    """Display nearby medical facilities on a map"""
+    if not medical_data or not medical_data.get('places'):
+        st.warning("No nearby medical facilities found")
+        return
+    
+    coordinates = medical_data['coordinates']
+    places = medical_data['places']
+    
+    # Building the folium map is slow, so its HTML is kept for the same facilities
+    map_key = (coordinates['lat'], coordinates['lng'], tuple(place.get('place_id') for place in places))
+    with span("render.facilities_map"):
+        map_html = memoized_render('facilities_map', map_key, lambda: render_facilities_map(coordinates, places))
+    components.html(map_html, width=700, height=510)
     
     st.subheader("🚑 Nearby Medical Facilities")
+    if any(place.get('source') == 'local' for place in places[:5]):
+        st.caption("📋 Facilities marked (offline list) come from a bundled list that may be out of date. Call ahead to confirm.")
     for i, place in enumerate(places[:5], 1):
+        distance = f"{place['distance_m'] / 1000:.1f} km" if 'distance_m' in place else 'Unknown'
         st.markdown(f"""
-        **{i}. {place['name']}**  
+        **{i}. {place['name']}**{' (offline list)' if place.get('source') == 'local' else ''}  
         ⭐ Rating: {place.get('rating', 'Not rated')}  
         📍 Address: {place.get('vicinity', 'Address not available')}  
+        📏 Distance: {distance}  
         """)
 
-def text_to_speech(text, language):
-    """Convert text to speech and return audio file path"""
+def show_emergency_contacts():
+    """Display emergency phone numbers"""
+    st.markdown("""
+    ### 📞 Emergency Contacts
+    - **Local Emergency**: 102 or 112
+    - **Poison Control**: 1800-425-1213
+    - **Mental Health Crisis**: 14416 
+    """)
+
+def play_speech(text, language, stream=True):
+    """Show audio players for text read aloud, returning whether it could be synthesized
+    
+    When streaming, the first chunk gets its own player as soon as it is ready, so it can be played while the
+    rest is synthesized into a second player. Otherwise all of it is synthesized into one player.
+    """
     try:
-        temp_dir = tempfile.mkdtemp()
-        audio_path = os.path.join(temp_dir, "output.mp3")
-        
-        tld_map = {
-            "English": "com",
-            "Hindi": "co.in",
-            "Telugu": "co.in"
-        }
-        lang_code = 'en' if language == "English" else 'hi'
+        if not stream:
+            with st.spinner("Creating voice output..."):
+                audio = synthesize(text, language)
+            if audio:
+                st.audio(audio, format="audio/mp3")
+            return bool(audio)
         
-        tts = gTTS(text=text, lang=lang_code, tld=tld_map.get(language, "com"), slow=False)
-        tts.save(audio_path)
-        return audio_path
+        with span("tts.synthesize", streamed=True):
+            chunks = synthesize_stream(text, language)
+            with st.spinner("Creating voice output..."):
+                first = next(chunks, b"")
+            if not first:
+                return False
+            st.audio(first, format="audio/mp3")
+            with st.spinner("Creating the rest of the voice output; you can start listening above..."):
+                rest = b"".join(chunks)
+            if rest:
+                st.audio(rest, format="audio/mp3")
+        return True
     except Exception as e:
         st.error(f"Error in text-to-speech: {str(e)}")
-        return None
+        return False
 
-def autoplay_audio(file_path):
-    """Autoplay audio in the browser"""
-    try:
-        with open(file_path, "rb") as f:
-            data = f.read()
-            b64 = base64.b64encode(data).decode()
-            md = f"""
-                <audio controls autoplay="true">
-                <source src="data:audio/mp3;base64,{b64}" type="audio/mp3">
-                </audio>
-                """
-            st.markdown(md, unsafe_allow_html=True)
-    except Exception as e:
-        st.error(f"Error playing audio: {str(e)}")
-    finally:
-        try:
-            if file_path and os.path.exists(file_path):
-                os.unlink(file_path)
-                os.rmdir(os.path.dirname(file_path))
-        except Exception as e:
-            pass
-
-def generate_nutrition_recommendations(health_data, user_info):
-    """Generate personalized nutrition advice"""
-    prompt = f"""As a nutritionist, provide detailed dietary recommendations based on:
+def fetch_medication_products(medication_name):
+    """Search pharmacy websites for a medication using Firecrawl, raising on failure"""
+    cache_key = normalize_medication_name(medication_name)
+    products = medication_search_cache.get(cache_key)
+    if products is not MISSING:
+        return products
     
-    Health Assessment: {health_data}
+    # Search for the medication on pharmacy websites
+    search_query = f"{medication_name} site:pharmeasy.in OR site:netmeds.com OR site:1mg.com OR site:apollopharmacy.in OR site:medplusmart.com"
     
-    Patient Information:
-    - Age: {user_info['age']}
-    - Gender: {user_info['gender']}
-    - Conditions: {user_info['medical_history']}
-    - Medications: {user_info['medications']}
-    - Allergies: {user_info['allergies']}
-    - Lifestyle: {user_info['lifestyle']}
-    
-    Provide:
-    1. Recommended foods and avoidances
-    2. Sample meal plan
-    3. Key nutrients to focus on
-    4. Hydration advice
-    5. Supplement suggestions
+    # Use Firecrawl to search for the medication
+    with span("firecrawl.search"):
+        scraped_data = outbound.call(
+            'firecrawl', firecrawl_client().search,
+            query=search_query,
+            limit=3  # Limit to top 3 results
+        )
     
-    Format with clear headings and bullet points."""
+    # Process the results
+    products = []
+    if scraped_data and isinstance(scraped_data, list):
+        for result in scraped_data[:3]:  # Limit to top 3 results
+            url = result.get('url', '')
+            product = {
+                'name': f"{medication_name.capitalize()} from {url.split('/')[2] if url else 'pharmacy'}",
+                'price': 'Check website for price',
+                'url': url if url else f"https://www.google.com/search?q={quote_plus(medication_name + ' buy online')}",
+                'source': url.split('/')[2] if url else 'Online Pharmacy'
+            }
+            products.append(product)
     
-    response = model.generate_content(prompt)
-    return response.text
+    products = products if products else None
+    medication_search_cache.set(cache_key, products)
+    return products
 
-def extract_medication_names(text):
-    """Extract medication names from the response text"""
-    # Common medication patterns
-    medication_pattern = r"(?i)\b(?:paracetamol|acetaminophen|ibuprofen|aspirin|omeprazole|loratadine|diphenhydramine|ranitidine|pepto-bismol|amoxicillin|doxycycline|cephalexin|azithromycin|penicillin|metformin|insulin|atorvastatin|simvastatin|lisinopril|losartan|metoprolol|propranolol|sertraline|fluoxetine|venlafaxine|tramadol|hydrocodone|oxycodone|codeine|morphine|fentanyl|diazepam|alprazolam|lorazepam|clonazepam|zolpidem|trazodone|quetiapine|risperidone|olanzapine|sumatriptan|propranolol|topiramate|valproate|carbamazepine|lamotrigine|levothyroxine|prednisone|hydrocortisone|fluticasone|salmeterol|albuterol|montelukast|levocetirizine|fexofenadine|cetirizine|pseudoephedrine|phenylephrine|dextromethorphan|guaifenesin|diphenhydramine|doxylamine|melatonin|omeprazole|lansoprazole|pantoprazole|ranitidine|famotidine|bisacodyl|senna|polyethylene glycol|loperamide|psyllium|metoclopramide|ondansetron|promethazine|dimenhydrinate|meclizine|scopolamine|warfarin|apixaban|rivaroxaban|clopidogrel|aspirin|enoxaparin|heparin|furosemide|hydrochlorothiazide|spironolactone|torsemide|finasteride|dutasteride|tamsulosin|alfuzosin|sildenafil|tadalafil|vardenafil|dapoxetine|fluconazole|clotrimazole|miconazole|terbinafine|acyclovir|valacyclovir|famciclovir|oseltamivir|zanamivir|hydroxychloroquine|ivermectin|azithromycin|doxycycline|ceftriaxone|vancomycin|meropenem|piperacillin|tazobactam|amikacin|gentamicin|tobramycin|ciprofloxacin|levofloxacin|moxifloxacin|nitrofurantoin|trimethoprim|sulfamethoxazole|metronidazole|clindamycin|linezolid|daptomycin|colistin|polymyxin b|chloramphenicol|tetracycline|minocycline|tigecycline|erythromycin|clarithromycin|azithromycin|clindamycin|vancomycin|daptomycin|linezolid|tedizolid|quinupristin|dalfopristin|telavancin|dalbavancin|oritavancin|ceftaroline|ceftobiprole|ceftolozane|tazobactam|ceftazidime|avibactam|meropenem|vaborbactam|imipenem|cilastatin|relebactam|ertapenem|doripenem|aztreonam|avibactam|plazomicin|eravacycline|omadacycline|sarecycline|lefamulin|delafloxacin|zabofloxacin|nemonoxacin|solithromycin|lefamulin|tedizolid|cadazolid|surotomycin|ridinilazole|afabicin|gepotidacin|zoliflodacin|contramid|solithromycin|lefamulin|tedizolid|cadazolid|surotomycin|ridinilazole|afabicin|gepotidacin|zoliflodacin|contramid)\b"
-    
-    medications = re.findall(medication_pattern, text, flags=re.IGNORECASE)
-    return list(set(medications))  # Remove duplicates
+def normalize_medication_name(medication_name):
+    """Normalize a medication name for use as a search or cache key"""
+    return " ".join(medication_name.lower().split())
 
-def search_medication_products(medication_name):
-    """Search for medication products using Firecrawl"""
-    if not firecrawl_app:
-        return None
+def search_medication_products_batch(medication_names, max_workers=MEDICATION_SEARCH_WORKERS):
+    """Search for several medications concurrently and return a map of name to products"""
+    results, errors = {}, {}
     
-    try:
-        # Search for the medication on pharmacy websites
-        search_query = f"{medication_name} site:pharmeasy.in OR site:netmeds.com OR site:1mg.com OR site:apollopharmacy.in OR site:medplusmart.com"
-        
-        # Use Firecrawl to search for the medication
-        scraped_data = firecrawl_app.search(
-            query=search_query,
-            limit=3  # Limit to top 3 results
-        )
-        
-        # Process the results
-        products = []
-        if scraped_data and isinstance(scraped_data, list):
-            for result in scraped_data[:3]:  # Limit to top 3 results
-                url = result.get('url', '')
-                product = {
-                    'name': f"{medication_name.capitalize()} from {url.split('/')[2] if url else 'pharmacy'}",
-                    'price': 'Check website for price',
-                    'url': url if url else f"https://www.google.com/search?q={medication_name}+buy+online",
-                    'source': url.split('/')[2] if url else 'Online Pharmacy'
-                }
-                products.append(product)
-        
-        return products if products else None
-    except Exception as e:
-        st.error(f"Error searching for medication: {str(e)}")
-        return None
+    # Skip prescription and unknown medications, take catalog links, and search each other name only once
+    queries = {}
+    for name in medication_names:
+        if medication_status(name) is not False:
+            continue
+        products = medication_catalog().products(name)
+        if products:
+            results[name] = products
+        else:
+            queries.setdefault(normalize_medication_name(name), []).append(name)
+    
+    if not firecrawl_configured() or not queries:
+        return results, errors
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(queries)))) as executor:
+        futures = {executor.submit(fetch_medication_products, query): query for query in queries}
+        for future in as_completed(futures):
+            query = futures[future]
+            try:
+                products = future.result()
+            except outbound.ServiceUnavailable:
+                products = None  # The fallback search links are shown right away instead
+            except Exception as e:
+                # Errors are shown later because Streamlit calls only work in the script thread
+                products = None
+                errors[query] = str(e)
+            for name in queries[query]:
+                results[name] = products
+    
+    return results, errors
+
+def medication_status(medication_name):
+    """Return True for a prescription medication, False for OTC, or None when it is not known"""
+    return medication_catalog().prescription_status(medication_name)
 
-def display_medication_products(medication_name):
+def display_medication_products(medication_name, products):
     """Display medication products with purchase links"""
     # First check if this is a prescription medication
-    prescription_meds = ['vancomycin', 'insulin', 'chemotherapy', 'warfarin', 
-                        'morphine', 'oxycodone', 'adderall', 'ritalin']
-    
-    if medication_name.lower() in prescription_meds:
+    status = medication_status(medication_name)
+    if status:
         st.warning(f"⚠️ {medication_name.capitalize()} is a prescription medication that cannot be purchased online without a doctor's prescription.")
         st.markdown("""
         Please consult with a licensed healthcare provider to obtain this medication.
@@ -322,50 +442,31 @@ def display_medication_products(medication_name):
         """)
         return
     
-    with st.spinner(f"Searching for {medication_name} products..."):
-        products = search_medication_products(medication_name)
-        
-        if products:
-            st.subheader(f"🛒 Purchase Options for {medication_name.capitalize()}")
-            
-            for i, product in enumerate(products, 1):
-                st.markdown(f"""
-                **{i}. {product['name']}**  
-                💵 Price: {product['price']}  
-                🏪 Source: {product['source']}  
-                🔗 [Buy Now]({product['url']})  
-                """)
-        else:
-            st.warning(f"Could not find direct purchase options for {medication_name}. Here are some alternative options:")
-            st.markdown(f"""
-            - [PharmEasy Search](https://pharmeasy.in/search/all?name={medication_name})
-            - [Netmeds Search](https://www.netmeds.com/catalogsearch/result/{medication_name}/all)
-            - [1mg Search](https://www.1mg.com/search/all?filter=true&name={medication_name})
-            - [Apollo Pharmacy Search](https://www.apollopharmacy.in/search-medicines/{medication_name})
-            - [Google Search](https://www.google.com/search?q={medication_name}+buy+online+india)
-            """)
-    """Display medication products with purchase links"""
-    with st.spinner(f"Searching for {medication_name} products..."):
-        products = search_medication_products(medication_name)
+    # An unrecognised medicine may be a prescription one, so it gets no purchase links
+    if status is None:
+        st.info(f"ℹ️ {medication_name} was not found in our medication catalog. Please consult a pharmacist or doctor before buying it.")
+        return
+    
+    if products:
+        st.subheader(f"🛒 Purchase Options for {medication_name.capitalize()}")
         
-        if products:
-            st.subheader(f"🛒 Purchase Options for {medication_name.capitalize()}")
-            
-            for i, product in enumerate(products, 1):
-                st.markdown(f"""
-                **{i}. {product['name']}**  
-                💵 Price: {product['price']}  
-                � Source: {product['source']}  
-                🔗 [Buy Now]({product['url']})  
-                """)
-        else:
-            st.warning(f"Could not find purchase options for {medication_name}. Here are some alternative options:")
+        for i, product in enumerate(products, 1):
             st.markdown(f"""
-            - [PharmEasy Search](https://pharmeasy.in/search/all?name={medication_name})
-            - [Netmeds Search](https://www.netmeds.com/catalogsearch/result/{medication_name}/all)
-            - [1mg Search](https://www.1mg.com/search/all?filter=true&name={medication_name})
-            - [Apollo Pharmacy Search](https://www.apollopharmacy.in/search-medicines/{medication_name})
+            **{i}. {product['name']}**  
+            💵 Price: {product['price']}  
+            🏪 Source: {product['source']}  
+            🔗 [Buy Now]({product['url']})  
             """)
+    else:
+        query, path = quote_plus(medication_name), quote(medication_name)
+        st.warning(f"Could not find direct purchase options for {medication_name}. Here are some alternative options:")
+        st.markdown(f"""
+        - [PharmEasy Search](https://pharmeasy.in/search/all?name={query})
+        - [Netmeds Search](https://www.netmeds.com/catalogsearch/result/{path}/all)
+        - [1mg Search](https://www.1mg.com/search/all?filter=true&name={query})
+        - [Apollo Pharmacy Search](https://www.apollopharmacy.in/search-medicines/{path})
+        - [Google Search](https://www.google.com/search?q={quote_plus(medication_name + ' buy online india')})
+        """)
 
 
 def main():
@@ -374,11 +475,11 @@ def main():
     st.title("🩺 AI Health Assistant")
     st.write("Get health assessments, medication advice, emergency help, and nutrition recommendations")
     
-    # Initialize Google Maps client
+    # Google Maps client, created once per process and reused across reruns
     gmaps = None
     try:
-        if os.getenv("GOOGLE_MAPS_API_KEY"):
-            gmaps = googlemaps.Client(key=os.getenv("GOOGLE_MAPS_API_KEY"))
+        if maps_configured():
+            gmaps = maps_client()
         else:
             st.warning("Google Maps API key not found. Emergency location services will be limited.")
     except Exception as e:
@@ -386,26 +487,64 @@ def main():
         gmaps = None
 
     # Check Firecrawl availability
-    if not firecrawl_app:
-        st.warning("Firecrawl API key not found. Medication purchase links will not be available.")
+    if not firecrawl_configured():
+        st.warning("Firecrawl API key not found. Medication purchase links will come from the local catalog only.")
 
     # Language selection
     language = st.sidebar.selectbox("🌐 Select Output Language", 
                                   ["English", "Hindi", "Telugu"],
                                   index=0)
     
+    # Response cache controls
+    with st.sidebar.expander("⚡ Response Cache"):
+        use_cache = not st.checkbox("Bypass cache", value=RESPONSE_CACHE_BYPASS)
+        st.json(cache_stats())
+    
+    # Per-stage latency of every traced call in this process
+    if st.sidebar.checkbox("🔍 Show performance metrics", value=DEBUG_PANEL):
+        st.sidebar.dataframe(tracer.snapshot(), hide_index=True)
+        with st.sidebar.expander("Model request queue"):
+            st.json(scheduler.stats())
+        with st.sidebar.expander("Outbound services"):
+            st.json(outbound.service_stats())
+        with st.sidebar.expander("Recent spans"):
+            st.json(tracer.recent_spans(20))
+    
+    # How image submissions are sent to Gemini
+    pipeline_mode = st.sidebar.selectbox("🧩 Image assessment pipeline", PIPELINE_MODES,
+                                         index=PIPELINE_MODES.index(ASSESSMENT_PIPELINE)
+                                         if ASSESSMENT_PIPELINE in PIPELINE_MODES else 0)
+    
+    # Structured assessments are parsed from JSON instead of scanned for keywords
+    output_format = "json" if st.sidebar.checkbox("Structured assessments (JSON)",
+                                                  value=OUTPUT_FORMAT == "json") else "text"
+    
+    # Streaming output and location used to prepare emergency help early
+    stream_output = st.sidebar.checkbox("Stream responses as they are generated", value=STREAM_RESPONSES,
+                                        disabled=output_format == "json",
+                                        help="Structured assessments are shown once they are complete")
+    emergency_location = st.sidebar.text_input("📍 Your city or area (for emergency help)")
+    
     # Initialize session state
     if 'response_data' not in st.session_state:
         st.session_state.response_data = {
             'text': None,
-            'audio_path': None,
             'show_results': False,
             'audio_generated': False,
-            'uploaded_image': None,
+            'audio_streamed': False,
+            'uploaded_images': [],
             'is_emergency': False,
             'show_nutrition': False,
             'nutrition_advice': None,
-            'medications_found': None
+            'medications_found': None,
+            'pipeline': None,
+            'response_id': None,
+            'result': None,
+            'user_input': None,
+            'nutrition_prefetch': None,
+            'red_flag': None,
+            'image_cache_scope': os.urandom(16).hex(),  # Near-duplicate photos share an analysis only in this session
+            'rendered': {}
         }
     
     with st.form("health_form"):
@@ -417,12 +556,30 @@ def main():
                                   height=100,
                                   placeholder="E.g.: 'Sharp headache behind right eye with nausea for 2 days'")
             
-            uploaded_file = st.file_uploader("📸 Upload photos of visible symptoms", 
-                                          type=["jpg", "jpeg", "png","webp"])
+            uploaded_files = st.file_uploader("📸 Upload photos of visible symptoms", 
+                                           type=["jpg", "jpeg", "png","webp"],
+                                           accept_multiple_files=True,
+                                           help=f"Up to {MAX_UPLOAD_IMAGES} photos, for example from different angles")
             
-            if uploaded_file:
-                st.session_state.response_data['uploaded_image'] = uploaded_file
-                st.image(uploaded_file, caption="Uploaded Symptom Image", width=200)
+            if len(uploaded_files) > MAX_UPLOAD_IMAGES:
+                st.warning(f"Only the first {MAX_UPLOAD_IMAGES} photos will be used.")
+            # Keep only the compact preprocessed copies of the current photos, and only redo new uploads
+            previous = {image.digest: image for image in st.session_state.response_data['uploaded_images']}
+            images = []
+            for uploaded_file in uploaded_files[:MAX_UPLOAD_IMAGES]:
+                image = previous.get(hashlib.sha256(uploaded_file.getvalue()).hexdigest())
+                if image is None:
+                    try:
+                        image = preprocess_image(uploaded_file)
+                    except Exception as e:
+                        # Leave the photo out rather than assess the symptoms against an earlier one
+                        st.error(f"Error reading image {uploaded_file.name}, so it is left out of the assessment: {str(e)}")
+                        continue
+                images.append(image)
+            st.session_state.response_data['uploaded_images'] = images
+            if images:
+                st.image([image.data for image in images],
+                         caption=[f"Uploaded Symptom Image {i}" for i in range(1, len(images) + 1)], width=200)
             
             duration = st.text_input("⏳ Duration", 
                                    placeholder="How long have you had these symptoms?")
@@ -460,7 +617,7 @@ def main():
         submitted = st.form_submit_button("Get Recommendations")
     
     if submitted:
-        if not symptoms.strip() and not st.session_state.response_data['uploaded_image']:
+        if not symptoms.strip() and not st.session_state.response_data['uploaded_images']:
             st.error("Please describe symptoms or upload an image")
         else:
             with st.spinner("Analyzing your information..."):
@@ -478,44 +635,98 @@ def main():
                     'lifestyle': lifestyle
                 }
                 
-                image_analysis = None
-                if st.session_state.response_data['uploaded_image']:
-                    image_analysis = analyze_image(st.session_state.response_data['uploaded_image'])
+                # Red flags found locally bring up emergency help before the model is even called
+                red_flag = pre_triage(user_input)
+                emergency_panel = st.empty()
+                if red_flag:
+                    with emergency_panel.container():
+                        show_emergency_alert(red_flag.reason)
+                
+                render_stream = None
+                if stream_output and output_format == "text":
+                    render_stream = lambda chunks: stream_assessment(chunks, gmaps, emergency_location,
+                                                                     "Emergency" if red_flag else None)
                 
-                response = generate_response(user_input, language, image_analysis)
-                st.session_state.response_data['text'] = response
+                # Warm the facility caches while the assessment is generated
+                if red_flag and gmaps and emergency_location:
+                    prefetch_facilities(gmaps, emergency_location)
+                response, pipeline = run_assessment_pipeline(user_input, language,
+                                                              st.session_state.response_data['uploaded_images'],
+                                                              mode=pipeline_mode, use_cache=use_cache,
+                                                              render_stream=render_stream,
+                                                              output_format=output_format,
+                                                              priority=EMERGENCY if red_flag else ASSESSMENT,
+                                                              cache_scope=st.session_state.response_data.get(
+                                                                  'image_cache_scope'))
+                emergency_panel.empty()
+                
+                # Parse once; rendering, speech and the PDF report all use the parsed result
+                result = parse_assessment(response)
+                st.session_state.response_data['pipeline'] = pipeline
+                st.session_state.response_data['result'] = result
+                st.session_state.response_data['text'] = result.text
+                st.session_state.response_data['response_id'] = hashlib.sha256(response.encode()).hexdigest()
                 st.session_state.response_data['audio_generated'] = False
                 st.session_state.response_data['show_results'] = True
-                st.session_state.response_data['is_emergency'] = "Urgency Level: Emergency" in response
                 st.session_state.response_data['nutrition_advice'] = None
+                st.session_state.response_data['user_input'] = user_input
+                
+                # Start on the nutrition plan now, so the button shows it without waiting
+                st.session_state.response_data['nutrition_prefetch'] = None
+                if NUTRITION_PREFETCH and not is_error_response(response):
+                    st.session_state.response_data['nutrition_prefetch'] = (
+                        language, prefetch_nutrition_recommendations(result, user_input, language, use_cache)
+                    )
                 
-                # Extract medication names for product search
-                if "### Medication Recommendations:" in response:
-                    medications = extract_medication_names(response)
-                    st.session_state.response_data['medications_found'] = medications
+                # A local red flag keeps the emergency section even if the model rates it lower
+                st.session_state.response_data['red_flag'] = red_flag
+                st.session_state.response_data['is_emergency'] = result.is_emergency or red_flag is not None
+                st.session_state.response_data['medications_found'] = result.medication_names or None
 
     # Display results
     if st.session_state.response_data.get('show_results', False):
-        colored_response = color_urgency_level(st.session_state.response_data['text'])
-        enhanced_response = enhance_medication_display(colored_response)
+        # Sections are rendered once per response and reused by the reruns that buttons trigger
+        response_id = st.session_state.response_data.get('response_id')
+        with span("render.assessment_html"):
+            enhanced_response = memoized_render(
+                'assessment', response_id, lambda: render_assessment_html(st.session_state.response_data['result'])
+            )
         
         st.subheader("Health Assessment")
+        pipeline = st.session_state.response_data.get('pipeline')
+        if pipeline and pipeline.get('image_error'):
+            st.warning(f"⚠️ Your photos could not be analyzed, so this assessment is based on your description only. "
+                       f"{pipeline['image_error']}")
         
-        if st.session_state.response_data.get('uploaded_image'):
-            st.image(st.session_state.response_data['uploaded_image'], 
-                    caption="Symptom Image Reference", 
+        if st.session_state.response_data.get('uploaded_images'):
+            images = st.session_state.response_data['uploaded_images']
+            st.image([image.data for image in images], 
+                    caption=["Symptom Image Reference"] * len(images), 
                     width=300)
         
         st.markdown(enhanced_response, unsafe_allow_html=True)
+        if st.session_state.response_data.get('pipeline'):
+            st.caption(format_pipeline_report(st.session_state.response_data['pipeline']))
         
         # Display medication purchase options if available
         if st.session_state.response_data.get('medications_found'):
             st.markdown("---")
             st.subheader("💊 Where to Buy Recommended Medications")
             
-            for med in st.session_state.response_data['medications_found']:
-                with st.expander(f"Purchase options for {med.capitalize()}"):
-                    display_medication_products(med)
+            medications = st.session_state.response_data['medications_found']
+            with span("section.medications", medications=len(medications)):
+                with st.spinner("Searching for medication products..."):
+                    purchase_options, search_errors = memoized_render(
+                        'medication_search', response_id, lambda: search_medication_products_batch(medications)
+                    )
+                for med, error in search_errors.items():
+                    st.error(f"Error searching for {med}: {error}")
+                if search_errors:
+                    st.session_state.response_data['rendered'].pop('medication_search', None)  # Retry on the next rerun
+                
+                for med in medications:
+                    with st.expander(f"Purchase options for {med.capitalize()}"):
+                        display_medication_products(med, purchase_options.get(med))
         
         # Medication safety tips
         st.info("""
@@ -531,81 +742,81 @@ def main():
         st.markdown("---")
         st.subheader("🔊 Listen to Recommendations")
         if st.button("Generate Audio"):
-            with st.spinner("Creating voice output..."):
-                audio_path = text_to_speech(st.session_state.response_data['text'], language)
-                st.session_state.response_data['audio_path'] = audio_path
-                if audio_path:
-                    autoplay_audio(audio_path)
+            st.session_state.response_data['audio_generated'] = True
+            st.session_state.response_data['audio_streamed'] = False
+        
+        # The first time, the opening sentences play while the rest is synthesized. Audio is cached per chunk,
+        # so later reruns show all of it in one player at no cost.
+        if st.session_state.response_data.get('audio_generated'):
+            played = play_speech(st.session_state.response_data['text'], language,
+                                 stream=not st.session_state.response_data.get('audio_streamed'))
+            st.session_state.response_data['audio_generated'] = played
+            st.session_state.response_data['audio_streamed'] = played
         
         # Nutrition Recommendations Button
         st.markdown("---")
         if st.button("🍎 Get Nutrition Recommendations"):
             with st.spinner("Generating personalized nutrition advice..."):
-                nutrition_prompt = f"""As a nutritionist, provide detailed dietary recommendations based on:
-                
-                Health Assessment: {st.session_state.response_data['text']}
-                
-                Patient Information:
-                - Age: {age}
-                - Gender: {gender}
-                - Conditions: {medical_history}
-                - Medications: {current_meds}
-                - Allergies: {allergies}
-                - Lifestyle: {lifestyle}
-                
-                Provide:
-                1. Recommended foods and avoidances (consider allergies)
-                2. Sample 1-day meal plan
-                3. Key nutrients to focus on
-                4. Hydration recommendations
-                5. Supplement suggestions (if needed)
-                6. Special considerations based on medications
-                
-                Format with clear headings and use food emojis for better readability."""
-                
-                nutrition_response = model.generate_content(nutrition_prompt)
-                st.session_state.response_data['nutrition_advice'] = nutrition_response.text
+                # Usually the plan was prefetched while the results were being read
+                prefetch = st.session_state.response_data.get('nutrition_prefetch')
+                if prefetch and prefetch[0] == language:
+                    nutrition_advice = prefetch[1].result()
+                else:
+                    nutrition_advice = generate_nutrition_recommendations(st.session_state.response_data['result'],
+                                                                          st.session_state.response_data['user_input'],
+                                                                          language, use_cache)
+            if is_error_response(nutrition_advice):
+                st.session_state.response_data['nutrition_prefetch'] = None  # Retry on the next click
+                st.error(nutrition_advice)
+            else:
+                st.session_state.response_data['nutrition_advice'] = nutrition_advice
         
         # Display nutrition advice if available
         if st.session_state.response_data.get('nutrition_advice'):
             st.markdown("---")
             st.subheader("🍏 Personalized Nutrition Plan")
             st.markdown(st.session_state.response_data['nutrition_advice'], unsafe_allow_html=True)
-            
-            # PDF Export
-            if st.button("📄 Save as PDF"):
-                pdf = FPDF()
-                pdf.add_page()
-                pdf.set_font("Arial", size=12)
-                clean_text = re.sub(r'<[^>]*>', '', st.session_state.response_data['nutrition_advice'])
-                pdf.multi_cell(0, 10, txt=clean_text)
-                pdf.output("nutrition_plan.pdf")
-                
-                with open("nutrition_plan.pdf", "rb") as f:
-                    st.download_button(
-                        label="⬇️ Download Nutrition Plan",
-                        data=f,
-                        file_name="personalized_nutrition_plan.pdf",
-                        mime="application/pdf"
-                    )
+        
+        # PDF Export, rendered in memory once per report content
+        st.markdown("---")
+        try:
+            with span("section.report"):
+                report = report_pdf(st.session_state.response_data['text'],
+                                    st.session_state.response_data.get('medications_found'),
+                                    st.session_state.response_data.get('nutrition_advice'))
+                st.download_button(
+                    label="📄 Save Health Report as PDF",
+                    data=report,
+                    file_name="health_report.pdf",
+                    mime="application/pdf"
+                )
+        except Exception as e:
+            st.error(f"Error creating PDF report: {str(e)}")
         
         # Emergency services
         if st.session_state.response_data.get('is_emergency', False):
             st.markdown("---")
             st.subheader("🆘 Emergency Assistance")
-            if gmaps:
-                location_input = st.text_input("Enter your location for nearby help:")
-                if location_input:
-                    with st.spinner("Finding emergency services..."):
-                        medical_data = get_nearby_medical_facilities(gmaps, location_input)
-                        if medical_data:
-                            show_medical_facilities_map(medical_data)
-            st.markdown("""
-            ### 📞 Emergency Contacts
-            - **Local Emergency**: 102 or 112
-            - **Poison Control**: 1800-425-1213
-            - **Mental Health Crisis**: 14416 
-            """)
+            if st.session_state.response_data.get('red_flag'):
+                st.warning(f"⚠️ Red flag in your symptoms: {st.session_state.response_data['red_flag'].reason}")
+            # The local facility index answers first; Google Maps results are added once they arrive
+            location_input = st.text_input("Enter your location for nearby help:",
+                                           value=emergency_location)
+            if location_input:
+                with st.spinner("Finding emergency services..."):
+                    medical_data = memoized_render(
+                        'facilities', normalize_location(location_input),
+                        lambda: get_nearby_medical_facilities(gmaps, location_input)
+                    )
+                    if medical_data:
+                        show_medical_facilities_map(medical_data)
+                        if medical_data.get('live_pending'):
+                            st.session_state.response_data['rendered'].pop('facilities', None)  # Search again on the next rerun
+                            st.caption("⏳ Google Maps results are still loading.")
+                            st.button("🔄 Add Google Maps results")
+                    else:
+                        st.warning("Could not find that location. Try a nearby city or coordinates as \"lat, lng\".")
+            show_emergency_contacts()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,201 @@
+"""Offline medication catalog in SQLite with an index over generic and brand names
+
+The catalog is bulk loaded from a CSV with one row per generic medicine:
+other generic names, brand names, Rx or OTC status, common strengths and
+pharmacy product URLs, the last three lists separated by "|". The database is
+rebuilt whenever the CSV changes, and then answers prescription checks and
+purchase-link lookups without any network call.
+
+A name is resolved only through whole catalog names among its words, so
+"morphine sulfate" is morphine, while a word like "acid" matches nothing.
+Misspelled and partial names are not guessed at, since a near match could
+be another medicine. A medicine that cannot be resolved is reported as
+unknown, never as OTC.
+"""
+import csv
+import os
+import re
+import sqlite3
+import threading
+from collections import namedtuple
+from functools import lru_cache
+from urllib.parse import urlparse
+
+from cache import CACHE_DIR
+from medication_lexicon import find_medications
+from tracing import traced
+
+MEDICATION_CATALOG_CSV = os.getenv(
+    "MEDICATION_CATALOG_CSV", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "medications.csv")
+)
+MEDICATION_CATALOG_PATH = os.getenv("MEDICATION_CATALOG_PATH", os.path.join(CACHE_DIR, "medications.sqlite3"))
+
+CatalogEntry = namedtuple("CatalogEntry", "generic synonyms brands prescription strengths urls")
+
+_TOKEN = re.compile(r"\w+")
+
+# Longest catalog name in words, the longest run of words looked up as one name
+MAX_NAME_WORDS = 4
+
+# Bumped when the tables change shape, so existing databases are rebuilt
+CATALOG_SCHEMA = 3
+
+
+def normalize_name(name):
+    """Lowercase a medication name and collapse its whitespace"""
+    return " ".join(str(name).lower().split())
+
+
+def name_key(name):
+    """Reduce a medication name to its lowercase words, so "Pepto-Bismol" and "pepto bismol" share a key"""
+    return " ".join(_TOKEN.findall(str(name).lower()))
+
+
+def split_list(value):
+    return tuple(item.strip() for item in (value or "").split("|") if item.strip())
+
+
+def source_version(csv_path):
+    """Identify a CSV by path, modification time and size, to tell when the catalog is stale"""
+    stat = os.stat(csv_path)
+    return f"{CATALOG_SCHEMA}:{os.path.abspath(csv_path)}:{stat.st_mtime_ns}:{stat.st_size}"
+
+
+class MedicationCatalog:
+    """Medication lookups by generic, synonym or brand name"""
+
+    def __init__(self, path=MEDICATION_CATALOG_PATH, csv_path=MEDICATION_CATALOG_CSV):
+        self.path = path
+        self.csv_path = csv_path
+        self._lock = threading.Lock()
+
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS medications ("
+            "id INTEGER PRIMARY KEY, generic TEXT UNIQUE, synonyms TEXT, brands TEXT, "
+            "prescription INTEGER, strengths TEXT, urls TEXT);"
+            "CREATE TABLE IF NOT EXISTS names (name TEXT PRIMARY KEY, medication_id INTEGER);"
+            "DROP TABLE IF EXISTS names_fts;"
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);"
+        )
+        if self.csv_path and os.path.exists(self.csv_path) and source_version(self.csv_path) != self._loaded_version():
+            self.load_csv(self.csv_path)
+
+    def _loaded_version(self):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'source'").fetchone()
+        return row[0] if row else None
+
+    def load_csv(self, csv_path):
+        """Replace the catalog with the rows of csv_path in one transaction"""
+        with open(csv_path, newline="", encoding="utf-8") as f:
+            rows = [row for row in csv.DictReader(f) if (row.get('generic') or "").strip()]
+
+        medications, names = [], []
+        for medication_id, row in enumerate(rows, 1):
+            generic = normalize_name(row['generic'])
+            synonyms, brands = split_list(row.get('synonyms')), split_list(row.get('brands'))
+            medications.append((
+                medication_id, generic, "|".join(synonyms), "|".join(brands),
+                int((row.get('status') or "").strip().lower() == "rx"),
+                row.get('strengths') or "", row.get('urls') or "",
+            ))
+            for name in (generic, *synonyms, *brands):
+                names.append((name_key(name), medication_id))
+
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for table in ("medications", "names"):
+                    self._conn.execute(f"DELETE FROM {table}")
+                self._conn.executemany("INSERT INTO medications VALUES (?, ?, ?, ?, ?, ?, ?)", medications)
+                # The first row to claim a name keeps it
+                self._conn.executemany("INSERT OR IGNORE INTO names VALUES (?, ?)", names)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta VALUES ('source', ?)",
+                    (source_version(csv_path),),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(medications)
+
+    def _entry(self, medication_id):
+        row = self._conn.execute(
+            "SELECT generic, synonyms, brands, prescription, strengths, urls FROM medications WHERE id = ?",
+            (medication_id,),
+        ).fetchone()
+        generic, synonyms, brands, prescription, strengths, urls = row
+        return CatalogEntry(generic, split_list(synonyms), split_list(brands), bool(prescription),
+                            split_list(strengths), split_list(urls))
+
+    @traced("catalog.lookup")
+    def resolve(self, name):
+        """Return the CatalogEntry of every catalog medicine named in name, in order of mention
+
+        Every run of up to MAX_NAME_WORDS words is looked up as a whole name,
+        longest first, so "Paracetamol (Crocin)" is paracetamol and
+        "amoxicillin clavulanate" is the combination rather than amoxicillin.
+        """
+        words = _TOKEN.findall(str(name).lower())
+        ids = []
+        with self._lock:
+            i = 0
+            while i < len(words):
+                for length in range(min(MAX_NAME_WORDS, len(words) - i), 0, -1):
+                    row = self._conn.execute(
+                        "SELECT medication_id FROM names WHERE name = ?", (" ".join(words[i:i + length]),)
+                    ).fetchone()
+                    if row:
+                        ids.append(row[0])
+                        i += length
+                        break
+                else:
+                    i += 1
+            return [self._entry(medication_id) for medication_id in dict.fromkeys(ids)]
+
+    def lookup(self, name):
+        """Return the CatalogEntry of the first medicine named in name, or None when the catalog has none"""
+        entries = self.resolve(name)
+        return entries[0] if entries else None
+
+    def prescription_status(self, name):
+        """Return True when name needs a prescription, False when it is OTC, or None when it is unknown
+
+        Names missing from the catalog are checked against the medication
+        lexicon, and a name mentioning any prescription medicine needs one.
+        """
+        entries = self.resolve(name)
+        mentions = find_medications(str(name))
+        if not entries and not mentions:
+            return None
+        return any(entry.prescription for entry in entries) or any(match.prescription for match in mentions)
+
+    def products(self, name):
+        """Return purchase links for an OTC medicine, shaped like a pharmacy search, or None when there are none"""
+        entries = self.resolve(name)
+        if len(entries) != 1 or self.prescription_status(name) is not False or not entries[0].urls:
+            return None
+        entry = entries[0]
+        label = entry.generic.capitalize()
+        if entry.strengths:
+            label = f"{label} {', '.join(entry.strengths)}"
+        products = []
+        for url in entry.urls:
+            source = urlparse(url).netloc or 'Online Pharmacy'
+            products.append({
+                'name': f"{label} from {source}",
+                'price': 'Check website for price',
+                'url': url,
+                'source': source,
+            })
+        return products
+
+
+@lru_cache(maxsize=None)
+def medication_catalog():
+    """Return the process-wide medication catalog, loading the CSV on first use if it changed"""
+    return MedicationCatalog()
@@ -0,0 +1,133 @@
+"""Medication lexicon with a precompiled word trie for single-pass tagging"""
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+# Medicines commonly sold over the counter
+OTC_MEDICATIONS = (
+    "paracetamol", "acetaminophen", "ibuprofen", "aspirin", "omeprazole",
+    "loratadine", "diphenhydramine", "ranitidine", "pepto-bismol",
+    "cetirizine", "levocetirizine", "fexofenadine", "pseudoephedrine",
+    "phenylephrine", "dextromethorphan", "guaifenesin", "doxylamine",
+    "melatonin", "lansoprazole", "famotidine", "bisacodyl", "senna",
+    "polyethylene glycol", "loperamide", "psyllium", "dimenhydrinate",
+    "meclizine", "clotrimazole", "miconazole", "terbinafine",
+    "hydrocortisone", "fluticasone",
+)
+
+# Medicines that need a doctor's prescription
+PRESCRIPTION_MEDICATIONS = (
+    "amoxicillin", "doxycycline", "cephalexin", "azithromycin", "penicillin",
+    "metformin", "insulin", "atorvastatin", "simvastatin", "lisinopril",
+    "losartan", "metoprolol", "propranolol", "sertraline", "fluoxetine",
+    "venlafaxine", "tramadol", "hydrocodone", "oxycodone", "codeine",
+    "morphine", "fentanyl", "diazepam", "alprazolam", "lorazepam",
+    "clonazepam", "zolpidem", "trazodone", "quetiapine", "risperidone",
+    "olanzapine", "sumatriptan", "topiramate", "valproate", "carbamazepine",
+    "lamotrigine", "levothyroxine", "prednisone", "salmeterol", "albuterol",
+    "montelukast", "pantoprazole", "metoclopramide", "ondansetron",
+    "promethazine", "scopolamine", "warfarin", "apixaban", "rivaroxaban",
+    "clopidogrel", "enoxaparin", "heparin", "furosemide",
+    "hydrochlorothiazide", "spironolactone", "torsemide", "finasteride",
+    "dutasteride", "tamsulosin", "alfuzosin", "sildenafil", "tadalafil",
+    "vardenafil", "dapoxetine", "fluconazole", "acyclovir", "valacyclovir",
+    "famciclovir", "oseltamivir", "zanamivir", "hydroxychloroquine",
+    "ivermectin", "ceftriaxone", "vancomycin", "meropenem", "piperacillin",
+    "tazobactam", "amikacin", "gentamicin", "tobramycin", "ciprofloxacin",
+    "levofloxacin", "moxifloxacin", "nitrofurantoin", "trimethoprim",
+    "sulfamethoxazole", "metronidazole", "clindamycin", "linezolid",
+    "daptomycin", "colistin", "polymyxin b", "chloramphenicol",
+    "tetracycline", "minocycline", "tigecycline", "erythromycin",
+    "clarithromycin", "tedizolid", "quinupristin", "dalfopristin",
+    "telavancin", "dalbavancin", "oritavancin", "ceftaroline",
+    "ceftobiprole", "ceftolozane", "ceftazidime", "avibactam",
+    "vaborbactam", "imipenem", "cilastatin", "relebactam", "ertapenem",
+    "doripenem", "aztreonam", "plazomicin", "eravacycline", "omadacycline",
+    "sarecycline", "lefamulin", "delafloxacin", "zabofloxacin",
+    "nemonoxacin", "solithromycin", "cadazolid", "surotomycin",
+    "ridinilazole", "afabicin", "gepotidacin", "zoliflodacin", "contramid",
+)
+
+# Alternative names that should be reported under one canonical name
+ALIASES = {
+    "acetaminophen": "paracetamol",
+}
+
+MedicationMatch = namedtuple("MedicationMatch", "start end text canonical prescription")
+
+_WORD = re.compile(r"\w+")
+_SEPARATOR = re.compile(r"[\s-]+")
+_END = "$"  # Trie key holding (canonical, prescription) for a complete name
+
+
+def _build_trie():
+    """Build a trie keyed on lowercase words, with separators on the edges"""
+    trie = {}
+    for names, prescription in ((OTC_MEDICATIONS, False), (PRESCRIPTION_MEDICATIONS, True)):
+        for name in dict.fromkeys(names):  # Drop duplicates, keep order
+            words = _WORD.findall(name)
+            separators = _SEPARATOR.findall(name)
+            node = trie.setdefault(words[0], {})
+            for separator, word in zip(separators, words[1:]):
+                node = node.setdefault((separator, word), {})
+            node.setdefault(_END, (ALIASES.get(name, name), prescription))
+    return trie
+
+
+_TRIE = _build_trie()
+
+
+@lru_cache(maxsize=64)
+def find_medications(text):
+    """Return every medication mention in text as a tuple of MedicationMatch"""
+    if not text:
+        return ()
+
+    matches = []
+    words = [(m.start(), m.end(), m.group().lower()) for m in _WORD.finditer(text)]
+    i = 0
+    while i < len(words):
+        start, end, word = words[i]
+        node = _TRIE.get(word)
+        if node is None:
+            i += 1
+            continue
+
+        # Follow the trie as far as the following words allow, keeping the longest name
+        best = (i, end, node[_END]) if _END in node else None
+        j = i
+        while j + 1 < len(words):
+            next_start, next_end, next_word = words[j + 1]
+            node = node.get((text[words[j][1]:next_start], next_word))
+            if node is None:
+                break
+            j += 1
+            if _END in node:
+                best = (j, next_end, node[_END])
+
+        if best is None:
+            i += 1
+            continue
+        last, end, (canonical, prescription) = best
+        matches.append(MedicationMatch(start, end, text[start:end], canonical, prescription))
+        i = last + 1
+
+    return tuple(matches)
+
+
+def medication_names(text):
+    """Return the distinct canonical medication names in order of first mention"""
+    return list(dict.fromkeys(match.canonical for match in find_medications(text)))
+
+
+def highlight_medications(text, template):
+    """Wrap each medication mention with template, which receives the matched text"""
+    parts = []
+    position = 0
+    for match in find_medications(text):
+        parts.append(text[position:match.start])
+        parts.append(template.format(match.text))
+        position = match.end
+    parts.append(text[position:])
+    return "".join(parts)
+
@@ -0,0 +1,181 @@
+"""Model backends that every generation call goes through
+
+MODEL_BACKEND selects the backend: "gemini" (the default) calls the Gemini API,
+"stub" returns canned answers locally for offline benchmarking and load tests.
+"""
+import json
+import os
+import re
+import threading
+import time
+
+import outbound
+
+# Gemini model used by the gemini backend
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+
+# Stub timing: delay before the first chunk, between chunks, and chunk size
+STUB_LATENCY = float(os.getenv("STUB_LATENCY", "0.5"))
+STUB_CHUNK_DELAY = float(os.getenv("STUB_CHUNK_DELAY", "0.02"))
+STUB_CHUNK_CHARS = int(os.getenv("STUB_CHUNK_CHARS", "40"))
+
+
+class ModelBackend:
+    """Interface for generating text from a prompt, or a list of prompt parts and images"""
+
+    model_name = None
+
+    def generate(self, contents):
+        """Return the full generated text"""
+        raise NotImplementedError
+
+    def stream(self, contents):
+        """Yield the generated text in chunks as it is produced"""
+        yield self.generate(contents)
+
+
+class GeminiBackend(ModelBackend):
+    """Backend that calls the Gemini API, importing the SDK on the first call"""
+
+    def __init__(self, model_name=GEMINI_MODEL):
+        self.model_name = model_name
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        """The Gemini model, created once on first use"""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    import google.generativeai as genai
+
+                    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+                    self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    # This SDK version takes no per-request timeout, so outbound enforces the deadline
+    def generate(self, contents):
+        return outbound.call('gemini', lambda: self.model.generate_content(contents).text)
+
+    def stream(self, contents):
+        yield from outbound.stream(
+            'gemini', lambda: (chunk.text for chunk in self.model.generate_content(contents, stream=True))
+        )
+
+
+STUB_URGENCY_RULES = (
+    ("Emergency", re.compile(r"chest pain|stroke|unconscious|not breathing|severe bleeding|seizure|worst pain ever", re.I)),
+    ("Seek care soon", re.compile(r"severity: severe|fever|worsening|infection|swelling", re.I)),
+)
+
+STUB_ASSESSMENT = """### Possible Conditions:
+1. Tension-type headache
+2. Viral upper respiratory infection
+3. Dehydration
+
+Urgency Level: {urgency}
+
+### Recommended Next Steps:
+- Rest, drink plenty of fluids and monitor your symptoms for the next 24-48 hours.
+- See a doctor if symptoms persist for more than 3 days or get worse.
+
+### Red Flag Symptoms:
+- Sudden severe headache, confusion, difficulty breathing or chest pain.
+
+### Medication Recommendations:
+- Paracetamol (Crocin, Dolo) 500 mg every 6 hours as needed, maximum 4 times per day.
+- Ibuprofen (Brufen) 400 mg every 8 hours with food, if you have no stomach or kidney problems.
+- Cetirizine 10 mg once daily for runny nose or sneezing.
+
+Please consult a doctor for a proper diagnosis.
+"""
+
+STUB_ASSESSMENT_FIELDS = {
+    "conditions": ["Tension-type headache", "Viral upper respiratory infection", "Dehydration"],
+    "next_steps": ["Rest, drink plenty of fluids and monitor your symptoms for the next 24-48 hours.",
+                   "See a doctor if symptoms persist for more than 3 days or get worse."],
+    "red_flags": ["Sudden severe headache, confusion, difficulty breathing or chest pain."],
+    "medications": [
+        {"name": "Paracetamol", "dose": "500 mg every 6 hours as needed, maximum 4 times per day"},
+        {"name": "Ibuprofen", "dose": "400 mg every 8 hours with food"},
+        {"name": "Cetirizine", "dose": "10 mg once daily for runny nose or sneezing"},
+    ],
+    "notes": "Please consult a doctor for a proper diagnosis.",
+}
+
+STUB_IMAGE_ANALYSIS = """Visible findings: mild redness and slight swelling without open wounds.
+Possible conditions: contact dermatitis, insect bite reaction.
+Urgency Level: Self-care
+"""
+
+STUB_NUTRITION = """### 🥗 Recommended Foods
+- 🍚 Rice, 🥣 dal and 🥦 steamed vegetables
+- 🍌 Bananas and 🍊 citrus fruit
+
+### 💧 Hydration
+- 8-10 glasses of water a day
+
+### 💊 Supplements
+- None needed unless advised by your doctor
+"""
+
+
+class StubBackend(ModelBackend):
+    """Deterministic local backend returning canned answers with configurable latency"""
+
+    model_name = "stub"
+
+    def __init__(self, latency=STUB_LATENCY, chunk_delay=STUB_CHUNK_DELAY, chunk_chars=STUB_CHUNK_CHARS):
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.chunk_chars = chunk_chars
+
+    def answer(self, contents):
+        """Pick the canned answer for a prompt"""
+        parts = contents if isinstance(contents, list) else [contents]
+        prompt = "\n".join(part for part in parts if isinstance(part, str))
+        if "Analyze this medical image" in prompt:
+            return STUB_IMAGE_ANALYSIS
+        if "medical images of the same patient" in prompt:
+            images = sum(not isinstance(part, str) for part in parts)
+            return "\n".join(f"Photo {i}:\n{STUB_IMAGE_ANALYSIS}" for i in range(1, images + 1))
+        if "nutritionist" in prompt:
+            return STUB_NUTRITION
+
+        urgency = "Self-care"
+        for level, pattern in STUB_URGENCY_RULES:
+            if pattern.search(prompt):
+                urgency = level
+                break
+        if "Respond only with a JSON object" in prompt:
+            return json.dumps({"urgency": urgency, **STUB_ASSESSMENT_FIELDS})
+        return STUB_ASSESSMENT.format(urgency=urgency)
+
+    def generate(self, contents):
+        text = self.answer(contents)
+        chunks = max(1, len(text) // self.chunk_chars)
+        time.sleep(self.latency + self.chunk_delay * chunks)
+        return text
+
+    def stream(self, contents):
+        text = self.answer(contents)
+        time.sleep(self.latency)
+        for start in range(0, len(text), self.chunk_chars):
+            if start:
+                time.sleep(self.chunk_delay)
+            yield text[start:start + self.chunk_chars]
+
+
+BACKENDS = {
+    "gemini": GeminiBackend,
+    "stub": StubBackend,
+}
+
+
+def get_backend(name=None):
+    """Create the backend named by name or the MODEL_BACKEND environment variable"""
+    name = (name or os.getenv("MODEL_BACKEND", "gemini")).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown model backend {name!r}, expected one of {', '.join(BACKENDS)}")
+    return BACKENDS[name]()
@@ -0,0 +1,305 @@
+"""Timeouts, deadlines and circuit breakers for every outbound service
+
+Each service (Google Maps, Firecrawl, gTTS and Gemini) has connect and read
+timeouts passed to its client where the client accepts them, and an overall
+deadline enforced here for the whole call. A service that keeps failing is
+skipped for a cool-down period, so callers get an error at once and show
+their fallback content instead of waiting on it again.
+
+Every service runs its calls on its own bounded pool of threads, so a slow
+service cannot hold the threads another one needs. The deadline starts when
+a thread picks the call up, and a call that waited a whole deadline without
+a free thread is dropped as busy without counting against the service.
+
+Only errors that say the service is down count as failures: deadline
+overruns, connection errors, timeouts and 408 or 5xx answers. A request the
+service refuses, such as a safety-blocked prompt or a bad request, is raised
+to the caller without counting against the service. So is a rate limit (429),
+which says the service is up but the quota is spent; the model scheduler
+backs off and retries those.
+"""
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from tracing import tracer
+
+ServiceLimits = namedtuple("ServiceLimits", "connect read deadline workers")
+
+# Threads per service running its calls so their deadline can be enforced, and so at most this many run at once
+OUTBOUND_WORKERS = int(os.getenv("OUTBOUND_WORKERS", "8"))
+
+
+def service_limits(service, connect, read, deadline, workers=OUTBOUND_WORKERS):
+    """Read a service's limits from <SERVICE>_CONNECT_TIMEOUT, _READ_TIMEOUT, _DEADLINE (seconds) and _CONCURRENCY"""
+    prefix = service.upper()
+    return ServiceLimits(
+        connect=float(os.getenv(f"{prefix}_CONNECT_TIMEOUT", str(connect))),
+        read=float(os.getenv(f"{prefix}_READ_TIMEOUT", str(read))),
+        deadline=float(os.getenv(f"{prefix}_DEADLINE", str(deadline))),
+        workers=int(os.getenv(f"{prefix}_CONCURRENCY", str(workers))),
+    )
+
+
+SERVICE_LIMITS = {
+    'maps': service_limits('maps', connect=3, read=5, deadline=8),
+    'firecrawl': service_limits('firecrawl', connect=3, read=10, deadline=12),
+    'tts': service_limits('tts', connect=3, read=10, deadline=15),
+    # As many threads as the model scheduler lets calls run, so calls left running past their deadline
+    # still count against its concurrency cap
+    'gemini': service_limits('gemini', connect=5, read=60, deadline=90,
+                             workers=int(os.getenv("MODEL_MAX_CONCURRENCY", "8"))),
+}
+
+# Consecutive failures that open a circuit, and seconds it stays open before one trial call
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_COOLDOWN = float(os.getenv("CIRCUIT_COOLDOWN", "30"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+# HTTP statuses meaning the service is failing, rather than the request being wrong or over quota
+TRANSIENT_STATUSES = frozenset({408})
+# Google Maps API statuses with the same meaning
+TRANSIENT_API_STATUSES = frozenset({"UNKNOWN_ERROR"})
+# Exception class names of network failures, matched by name so no client library has to be imported
+NETWORK_ERROR_NAMES = frozenset({"ConnectionError", "Timeout", "TimeoutError", "TransportError"})
+
+executors = {
+    service: ThreadPoolExecutor(max_workers=limits.workers, thread_name_prefix=f"outbound-{service}")
+    for service, limits in SERVICE_LIMITS.items()
+}
+
+
+class ServiceUnavailable(RuntimeError):
+    """Raised when a service is skipped or gave no answer in time"""
+
+
+class CircuitOpen(ServiceUnavailable):
+    """Raised instead of calling a service whose circuit is open"""
+
+
+class DeadlineExceeded(ServiceUnavailable, TimeoutError):
+    """Raised when a call did not finish within its service's deadline"""
+
+
+class ServiceBusy(ServiceUnavailable):
+    """Raised when every thread of a service stayed busy for a whole deadline, so the call never started"""
+
+
+def timeouts(service):
+    """Return the (connect, read) timeout pair for a service, in the form requests accepts"""
+    limits = SERVICE_LIMITS[service]
+    return limits.connect, limits.read
+
+
+class CircuitBreaker:
+    """Opens after failure_threshold consecutive failures and lets one trial call through after cooldown"""
+
+    def __init__(self, name, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, cooldown=CIRCUIT_COOLDOWN):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.counts = {'calls': 0, 'failures': 0, 'refused': 0, 'rejected': 0, 'busy': 0, 'opened': 0}
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Check whether a call may go ahead, moving an open circuit to half-open after the cooldown"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            # A trial call that never reported back is replaced after another cooldown
+            if time.monotonic() - self.opened_at >= self.cooldown:
+                self.opened_at = time.monotonic()
+                self._set_state(HALF_OPEN)
+                return True  # Only this call is let through until it succeeds or fails
+            self.counts['rejected'] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.counts['calls'] += 1
+            self.failures = 0
+            self._set_state(CLOSED)
+
+    def record_refusal(self):
+        """Count a call the service answered with an error about the request, which says nothing of its health"""
+        with self._lock:
+            self.counts['calls'] += 1
+            self.counts['refused'] += 1
+            if self.state == HALF_OPEN:  # It answered, so it is up again
+                self.failures = 0
+                self._set_state(CLOSED)
+
+    def record_busy(self):
+        """Count a call dropped before it started, which says nothing of the service's health"""
+        with self._lock:
+            self.counts['busy'] += 1
+
+    def record_failure(self):
+        with self._lock:
+            self.counts['calls'] += 1
+            self.counts['failures'] += 1
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.counts['opened'] += 1
+                self.opened_at = time.monotonic()
+                self._set_state(OPEN)
+
+    def _set_state(self, state):
+        self.state = state
+        tracer.set_gauge(f"circuit_open_{self.name}", int(state == OPEN))
+
+    def retry_in(self):
+        """Seconds until an open circuit lets a trial call through"""
+        with self._lock:
+            if self.state != OPEN:
+                return 0.0
+            return max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+
+    def stats(self):
+        with self._lock:
+            return {'state': self.state, 'consecutive_failures': self.failures, **self.counts}
+
+
+breakers = {service: CircuitBreaker(service) for service in SERVICE_LIMITS}
+
+
+def status_code(error):
+    """Return the HTTP status an error carries, from the client's error or its response, or None"""
+    for value in (getattr(error, 'status_code', None), getattr(error, 'code', None)):
+        if isinstance(value, int):
+            return value
+    for attribute in ('response', 'rsp'):  # requests and gTTS keep the response under these names
+        value = getattr(getattr(error, attribute, None), 'status_code', None)
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def is_service_failure(error):
+    """Check whether an error means the service is down or overloaded, following the errors it wraps"""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, ServiceUnavailable):
+            return True
+        status = status_code(error)
+        if status is not None:
+            return status in TRANSIENT_STATUSES or status >= 500
+        if getattr(error, 'status', None) in TRANSIENT_API_STATUSES:
+            return True
+        if any(cls.__name__ in NETWORK_ERROR_NAMES for cls in type(error).__mro__):
+            return True
+        error = getattr(error, 'base_exception', None) or error.__cause__ or error.__context__
+    return False
+
+
+def _record_error(breaker, error):
+    if is_service_failure(error):
+        breaker.record_failure()
+    else:
+        breaker.record_refusal()
+
+
+def _admit(service):
+    breaker = breakers[service]
+    if not breaker.allow():
+        raise CircuitOpen(f"{service} is skipped after repeated failures; next try in {breaker.retry_in():.0f}s")
+    return breaker
+
+
+def _start(service, breaker, function, *args, **kwargs):
+    """Submit function to the service's threads and wait until one starts running it"""
+    started = threading.Event()
+
+    def run():
+        started.set()
+        return function(*args, **kwargs)
+
+    future = executors[service].submit(run)
+    if not started.wait(SERVICE_LIMITS[service].deadline) and future.cancel():
+        breaker.record_busy()
+        raise ServiceBusy(f"{service} is busy; no call slot freed up within {SERVICE_LIMITS[service].deadline:g}s")
+    return future
+
+
+def call(service, function, *args, **kwargs):
+    """Call function within the service's deadline and circuit breaker, raising ServiceUnavailable when skipped
+
+    A call past its deadline keeps running in the background until the
+    client's own timeouts end it, but the caller stops waiting for it.
+    """
+    breaker = _admit(service)
+    future = _start(service, breaker, function, *args, **kwargs)
+    try:
+        result = future.result(timeout=SERVICE_LIMITS[service].deadline)
+    except FutureTimeout:
+        breaker.record_failure()
+        raise DeadlineExceeded(f"{service} did not answer within {SERVICE_LIMITS[service].deadline:g}s") from None
+    except Exception as e:
+        _record_error(breaker, e)
+        raise
+    breaker.record_success()
+    return result
+
+
+_END = object()
+
+
+def stream(service, iterable_factory):
+    """Yield from iterable_factory() within the service's deadline and circuit breaker
+
+    The deadline covers the whole stream, and the read timeout the gap between chunks.
+    """
+    breaker = _admit(service)
+    limits = SERVICE_LIMITS[service]
+    chunks = queue.Queue()
+    cancelled = threading.Event()
+
+    def pump():
+        try:
+            for chunk in iterable_factory():
+                if cancelled.is_set():
+                    return
+                chunks.put((chunk, None))
+            chunks.put((_END, None))
+        except Exception as e:
+            chunks.put((_END, e))
+
+    _start(service, breaker, pump)
+    deadline = time.monotonic() + limits.deadline
+    received = False
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                chunk, error = chunks.get(timeout=max(0.0, min(limits.read, remaining)))
+            except queue.Empty:
+                breaker.record_failure()
+                limit = f"{limits.read:g}s between chunks" if remaining > limits.read else f"{limits.deadline:g}s"
+                raise DeadlineExceeded(f"{service} did not answer within {limit}") from None
+            if error is not None:
+                _record_error(breaker, error)
+                raise error
+            if chunk is _END:
+                breaker.record_success()
+                return
+            received = True
+            yield chunk
+    finally:
+        cancelled.set()
+        if received and breaker.state == HALF_OPEN:
+            breaker.record_success()  # The caller stopped reading, but the service was answering
+
+
+def service_stats():
+    """Return the circuit state and counters of every outbound service"""
+    return {service: breaker.stats() for service, breaker in breakers.items()}
@@ -0,0 +1,126 @@
+"""Local red-flag rules that spot likely emergencies before any model call
+
+Symptoms may be typed in English, Hindi or Telugu whatever the output
+language, so every rule matches phrases from all three tables.
+"""
+import re
+from collections import namedtuple
+
+from tracing import traced
+
+RedFlag = namedtuple("RedFlag", ["rule", "reason"])
+
+# Each rule is a reason and groups of phrases; every group must match somewhere in the symptoms.
+# Phrases are regular expressions; English ones are matched on word boundaries.
+RED_FLAG_RULES = {
+    "heart_attack": ("Possible heart attack", [{
+        "English": [r"heart attack", r"cardiac arrest"],
+        "Hindi": [r"दिल का दौरा", r"हार्ट अटैक"],
+        "Telugu": [r"గుండెపోటు", r"గుండె పోటు"],
+    }]),
+    "cardiac_chest_pain": ("Chest pain spreading to the arm, jaw or back, or with sweating or breathlessness", [{
+        "English": [r"chest (pain|tightness|pressure|heaviness)", r"pain in (my |the )?chest"],
+        "Hindi": [r"सीने में (दर्द|जकड़न|भारीपन)", r"छाती में (दर्द|जकड़न|भारीपन)"],
+        "Telugu": [r"ఛాతీ ?(లో)? ?నొప్పి", r"ఛాతిలో నొప్పి", r"ఛాతీ బరువు"],
+    }, {
+        "English": [r"(left )?arms?", r"jaw", r"radiat\w*", r"spread\w*", r"sweat\w*", r"short(ness)? of breath",
+                    r"breathless\w*", r"(pain|ache)\w* (\w+ ){0,3}?(to|into|through) (the |my )?back"],
+        "Hindi": [r"बांह", r"बाँह", r"हाथ", r"जबड़", r"पसीना", r"सांस", r"साँस"],
+        "Telugu": [r"చేయి", r"చేతి", r"దవడ", r"చెమట", r"ఊపిరి", r"శ్వాస"],
+    }]),
+    "stroke": ("Possible stroke: face drooping, weakness on one side or slurred speech", [{
+        "English": [r"stroke", r"face (is )?droop\w*", r"droop\w* face", r"slurred speech", r"slurring",
+                    r"(weak|numb)\w* on one side", r"one side of (my |the )?(body|face) (is )?(weak|numb)\w*",
+                    r"can'?t (move|lift) (my |one )?(arm|leg)", r"sudden (confusion|vision loss|numbness)"],
+        "Hindi": [r"लकवा", r"चेहरा (टेढ़ा|लटक)", r"बोलने में (दिक्कत|परेशानी)", r"ज़?ज?बान लड़खड़ा",
+                  r"एक तरफ (कमजोरी|सुन्न)"],
+        "Telugu": [r"పక్షవాతం", r"మాట తడబడ", r"ముఖం వంకర", r"ఒక వైపు (బలహీనత|తిమ్మిరి)"],
+    }]),
+    "breathing": ("Severe difficulty breathing", [{
+        "English": [r"not breathing", r"can'?t breathe", r"cannot breathe", r"unable to breathe", r"choking",
+                    r"gasping", r"blue lips", r"severe (shortness of breath|breathlessness)"],
+        "Hindi": [r"सा[ंँ]स नहीं (आ|ले)", r"सा[ंँ]स लेने में (बहुत )?(तकलीफ|दिक्कत)", r"दम घुट"],
+        "Telugu": [r"ఊపిరి ఆడ(టం|డం) లేదు", r"(శ్వాస|ఊపిరి) తీసుకోవడం (చాలా )?కష్టం"],
+    }]),
+    "unconscious": ("Loss of consciousness", [{
+        "English": [r"unconscious", r"unresponsive", r"passed out", r"fainted", r"collapsed"],
+        "Hindi": [r"बेहोश"],
+        "Telugu": [r"స్పృహ (కోల్పో|లేదు|తప్ప)"],
+    }]),
+    "seizure": ("Seizure", [{
+        "English": [r"seizures?", r"convulsions?",
+                    r"(having|had|has|got|getting) fits(?! of (cough|sneez|laugh)\w*)"],
+        "Hindi": [r"मिर्गी", r"दौरा पड़", r"झटके आ"],
+        "Telugu": [r"మూర్ఛ", r"ఫిట్స్"],
+    }]),
+    "bleeding": ("Severe bleeding or vomiting or coughing blood", [{
+        "English": [r"(severe|heavy|uncontrolled|profuse) bleeding", r"bleeding (heavily|a lot|won'?t stop)",
+                    r"(vomiting|coughing|throwing) (up )?blood", r"blood in (my )?vomit"],
+        "Hindi": [r"खून की उल्टी", r"बहुत (ज़्यादा|ज्यादा )?खून", r"खा[ंँ]सी में खून", r"खून नहीं रुक"],
+        "Telugu": [r"రక్త(ం)? ?వాంతి", r"తీవ్ర(మైన)? రక్తస్రావం", r"రక్తం ఆగడం లేదు"],
+    }]),
+    "anaphylaxis": ("Possible severe allergic reaction", [{
+        "English": [r"(throat|tongue|lips?) (is |are )?swell\w*", r"swollen (throat|tongue)", r"anaphyla\w*",
+                    r"can'?t swallow"],
+        "Hindi": [r"गले में सूजन", r"जीभ में सूजन", r"निगल नहीं"],
+        "Telugu": [r"గొంతు వాపు", r"నాలుక వాపు", r"మింగలేక"],
+    }]),
+    "self_harm": ("Thoughts of suicide or self-harm", [{
+        "English": [r"suicid\w*", r"kill (myself|me)", r"want to die", r"end my life", r"self[- ]harm",
+                    r"overdos\w*"],
+        "Hindi": [r"आत्महत्या", r"मरना चाहत", r"जान देना"],
+        "Telugu": [r"ఆత్మహత్య", r"చనిపోవాలని"],
+    }]),
+}
+
+# Words that cancel an English phrase up to five words after them in the same clause, as in "no chest pain"
+# or "not spreading to my arm or jaw", but not "no fever but chest pain" or "not sure if my chest pain"
+NEGATION = re.compile(r"\b(no|not|without|denies|never)(\s+(?!(but|and|with|although|though|sure)\b)\w+){0,5}\s+$")
+NEGATION_WINDOW = 40  # Characters before a phrase searched for a negation
+
+# Severity and onset choices on the form that are red flags together
+SUDDEN_WORST_PAIN = RedFlag("sudden_worst_pain", "Sudden onset of the worst pain ever")
+SEVERE_CHEST_PAIN = RedFlag("severe_chest_pain", "Severe chest pain")
+CHEST_LOCATION = re.compile(r"\bchest\b|सीन|छाती|ఛాతీ|ఛాతి")
+# The symptoms must describe pain for a severe chest location to count, so a severe rash on the chest does not
+CHEST_PAIN_WORDS = re.compile(r"\b(pain|pressure|tightness|heaviness|hurts?|aches?)\b|दर्द|जकड़न|भारीपन|నొప్పి|బరువు")
+
+
+def compile_group(phrases):
+    """Join one group's phrases from every language into one pattern"""
+    english = [rf"\b{phrase}\b" for phrase in phrases.get("English", [])]
+    others = [phrase for language, items in phrases.items() if language != "English" for phrase in items]
+    return re.compile("|".join(f"(?:{phrase})" for phrase in english + others))
+
+
+COMPILED_RULES = [
+    (RedFlag(rule, reason), [compile_group(group) for group in groups])
+    for rule, (reason, groups) in RED_FLAG_RULES.items()
+]
+
+
+def matches(pattern, text):
+    """Check whether pattern occurs in text other than right after a negation"""
+    for match in pattern.finditer(text):
+        if not NEGATION.search(text, max(0, match.start() - NEGATION_WINDOW), match.start()):
+            return True
+    return False
+
+
+@traced("pretriage.red_flags")
+def pre_triage(user_input):
+    """Return the first red flag found in the form fields, or None when there is none"""
+    text = " ".join(str(user_input.get(field) or "") for field in ('symptoms', 'location')).lower()
+    for red_flag, groups in COMPILED_RULES:
+        if all(matches(group, text) for group in groups):
+            return red_flag
+
+    severity = str(user_input.get('severity') or "")
+    onset = str(user_input.get('onset') or "")
+    if severity == "Worst pain ever" and onset == "Sudden":
+        return SUDDEN_WORST_PAIN
+    if (severity in ("Severe", "Worst pain ever")
+            and CHEST_LOCATION.search(str(user_input.get('location') or "").lower())
+            and matches(CHEST_PAIN_WORDS, str(user_input.get('symptoms') or "").lower())):
+        return SEVERE_CHEST_PAIN
+    return None
@@ -0,0 +1,85 @@
+"""In-memory PDF health reports"""
+import hashlib
+import json
+import os
+import re
+
+from cache import MISSING, MemoryCache, shared_cache
+from tracing import traced
+
+# TTF font with wide Unicode coverage, needed for Hindi and Telugu reports
+REPORT_FONT_PATH = os.getenv("REPORT_FONT_PATH")
+
+HTML_TAG = re.compile(r"<[^>]*>")
+MARKDOWN_SYMBOLS = re.compile(r"[#*_`]+")
+
+report_cache = shared_cache(
+    "reports",
+    factory=MemoryCache,
+    ttl=int(os.getenv("REPORT_CACHE_TTL", "3600")),  # 1 hour
+    max_entries=int(os.getenv("REPORT_CACHE_SIZE", "100"))
+)
+
+
+def clean_text(text, unicode_font):
+    """Strip HTML and markdown, and replace characters the core fonts cannot draw"""
+    text = MARKDOWN_SYMBOLS.sub("", HTML_TAG.sub("", text))
+    if not unicode_font:
+        text = text.encode("latin-1", "replace").decode("latin-1")
+    return text
+
+
+@traced("fpdf.render_report")
+def render_report(assessment, medications=None, nutrition=None):
+    """Render the health assessment, medication list and nutrition plan as PDF bytes"""
+    from fpdf import FPDF
+
+    pdf = FPDF()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.add_page()
+
+    family = "Arial"
+    if REPORT_FONT_PATH:
+        pdf.add_font("Report", fname=REPORT_FONT_PATH)
+        pdf.add_font("Report", style="B", fname=REPORT_FONT_PATH)
+        family = "Report"
+    unicode_font = family != "Arial"
+
+    def heading(text, size=14):
+        pdf.set_font(family, style="B", size=size)
+        pdf.multi_cell(0, 10, clean_text(text, unicode_font), new_x="LMARGIN", new_y="NEXT")
+
+    def body(text):
+        pdf.set_font(family, size=11)
+        pdf.multi_cell(0, 6, clean_text(text, unicode_font), new_x="LMARGIN", new_y="NEXT")
+        pdf.ln(4)
+
+    heading("AI Health Assistant - Health Report", size=16)
+
+    heading("Health Assessment")
+    body(assessment)
+
+    if medications:
+        heading("Medications Mentioned")
+        body("\n".join(f"- {name.capitalize()}" for name in medications))
+
+    if nutrition:
+        heading("Personalized Nutrition Plan")
+        body(nutrition)
+
+    pdf.set_font(family, size=9)
+    pdf.multi_cell(0, 5, "This report provides preliminary health information only and is not a substitute "
+                         "for professional medical advice, diagnosis, or treatment.",
+                   new_x="LMARGIN", new_y="NEXT")
+    return bytes(pdf.output())
+
+
+def report_pdf(assessment, medications=None, nutrition=None):
+    """Return the PDF report for this content, rendering it only the first time"""
+    content = json.dumps([assessment, medications or [], nutrition or "", REPORT_FONT_PATH])
+    key = hashlib.sha256(content.encode()).hexdigest()
+    pdf = report_cache.get(key)
+    if pdf is MISSING:
+        pdf = render_report(assessment, medications, nutrition)
+        report_cache.set(key, pdf)
+    return pdf
@@ -0,0 +1,220 @@
+"""Process-wide scheduler for model requests
+
+Every model call in the process waits its turn here. Token buckets keep
+requests and prompt tokens under the per-minute quotas, at most
+max_concurrency calls run at once, emergencies and first assessments go
+ahead of follow-up requests, and rate-limit or server errors are retried
+with jittered exponential backoff.
+"""
+import heapq
+import itertools
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from tracing import span, tracer
+
+# Lower numbers are served first
+EMERGENCY, ASSESSMENT, FOLLOW_UP = 0, 1, 2
+PRIORITY_NAMES = {EMERGENCY: "emergency", ASSESSMENT: "assessment", FOLLOW_UP: "follow_up"}
+
+# Quotas and limits; 0 means no limit for the per-minute quotas
+MODEL_REQUESTS_PER_MINUTE = int(os.getenv("MODEL_REQUESTS_PER_MINUTE", "0"))
+MODEL_TOKENS_PER_MINUTE = int(os.getenv("MODEL_TOKENS_PER_MINUTE", "0"))
+MODEL_MAX_CONCURRENCY = int(os.getenv("MODEL_MAX_CONCURRENCY", "8"))
+MODEL_MAX_RETRIES = int(os.getenv("MODEL_MAX_RETRIES", "3"))
+MODEL_QUEUE_TIMEOUT = float(os.getenv("MODEL_QUEUE_TIMEOUT", "60"))
+
+# Gemini bills an image as a fixed number of tokens
+IMAGE_TOKENS = 258
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+RETRYABLE_MESSAGE = re.compile(r"\b(429|500|502|503|504)\b|quota|rate limit|resource exhausted|unavailable", re.I)
+
+
+class SchedulerTimeout(RuntimeError):
+    """Raised when a request waited longer than the queue timeout"""
+
+
+def estimate_tokens(contents):
+    """Roughly estimate the prompt tokens of a prompt or a list of prompt parts and images"""
+    parts = contents if isinstance(contents, list) else [contents]
+    return sum(len(part) // 4 + 1 if isinstance(part, str) else IMAGE_TOKENS for part in parts)
+
+
+def is_retryable(error):
+    """Check whether an error is a rate limit or a server error worth retrying"""
+    code = getattr(error, 'code', None) or getattr(error, 'status_code', None)
+    if isinstance(code, int):
+        return code in RETRYABLE_STATUS
+    return bool(RETRYABLE_MESSAGE.search(str(error)))
+
+
+class TokenBucket:
+    """Refills at per_minute tokens a minute up to capacity; not thread-safe on its own"""
+
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """Seconds until amount tokens are available, 0 when they are available now"""
+        if not self.rate:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.capacity)  # A request larger than the bucket waits for a full one
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount):
+        if self.rate:
+            self.level -= min(amount, self.capacity)
+
+
+class ModelScheduler:
+    """Admits model calls in priority order within the rate, token and concurrency limits"""
+
+    def __init__(self, requests_per_minute=MODEL_REQUESTS_PER_MINUTE, tokens_per_minute=MODEL_TOKENS_PER_MINUTE,
+                 max_concurrency=MODEL_MAX_CONCURRENCY, max_retries=MODEL_MAX_RETRIES,
+                 queue_timeout=MODEL_QUEUE_TIMEOUT, backoff=1.0):
+        self.max_retries = max_retries
+        self.queue_timeout = queue_timeout
+        self.backoff = backoff
+        self._condition = threading.Condition()
+        self._queue = []  # Heap of (priority, sequence) for waiting calls
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self._counts = {'completed': 0, 'failed': 0, 'retries': 0, 'timeouts': 0}
+        self.set_limits(requests_per_minute, tokens_per_minute, max_concurrency)
+
+    def set_limits(self, requests_per_minute=None, tokens_per_minute=None, max_concurrency=None):
+        """Change the quotas and concurrency cap; None keeps the current value"""
+        with self._condition:
+            if requests_per_minute is not None:
+                self.requests = TokenBucket(requests_per_minute)
+            if tokens_per_minute is not None:
+                self.tokens = TokenBucket(tokens_per_minute)
+            if max_concurrency is not None:
+                self.max_concurrency = max(1, max_concurrency)
+            self._condition.notify_all()
+
+    @contextmanager
+    def limits(self, requests_per_minute=None, tokens_per_minute=None, max_concurrency=None):
+        """Apply set_limits for the length of a with block, then restore the limits in force before it"""
+        with self._condition:
+            saved = (self.requests, self.tokens, self.max_concurrency)
+        self.set_limits(requests_per_minute, tokens_per_minute, max_concurrency)
+        try:
+            yield self
+        finally:
+            with self._condition:
+                self.requests, self.tokens, self.max_concurrency = saved
+                self._condition.notify_all()
+
+    def _acquire(self, priority, tokens):
+        """Block until this call is first in line and fits every limit"""
+        entry = (priority, next(self._sequence))
+        deadline = time.monotonic() + self.queue_timeout
+        with self._condition:
+            heapq.heappush(self._queue, entry)
+            self._publish()
+            try:
+                while True:
+                    wait = None
+                    if self._queue[0] == entry and self._in_flight < self.max_concurrency:
+                        wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+                        if not wait:
+                            heapq.heappop(self._queue)
+                            self.requests.take(1)
+                            self.tokens.take(tokens)
+                            self._in_flight += 1
+                            self._condition.notify_all()  # The next call in line may fit too
+                            return
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counts['timeouts'] += 1
+                        raise SchedulerTimeout(f"Model request queue is busy; waited {self.queue_timeout:.0f}s")
+                    self._condition.wait(remaining if wait is None else min(wait, remaining))
+            finally:
+                if entry in self._queue:
+                    self._queue.remove(entry)
+                    heapq.heapify(self._queue)
+                    self._condition.notify_all()
+                self._publish()
+
+    def _release(self, error=None):
+        with self._condition:
+            self._in_flight -= 1
+            self._counts['failed' if error else 'completed'] += 1
+            self._condition.notify_all()
+            self._publish()
+
+    def _backoff(self, attempt):
+        with self._condition:
+            self._counts['retries'] += 1
+        time.sleep(self.backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+
+    def call(self, function, contents, priority=ASSESSMENT):
+        """Run function(contents) when scheduled, retrying rate-limit and server errors"""
+        tokens = estimate_tokens(contents)
+        for attempt in range(self.max_retries + 1):
+            with span("scheduler.wait", priority=PRIORITY_NAMES.get(priority, str(priority))):
+                self._acquire(priority, tokens)
+            error = None
+            try:
+                return function(contents)
+            except Exception as e:
+                error = e
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+            finally:
+                self._release(error)
+            self._backoff(attempt)
+
+    def stream(self, function, contents, priority=ASSESSMENT):
+        """Yield from function(contents) when scheduled, holding a slot until the stream ends
+
+        Errors are retried only before the first chunk, since later ones cannot be undone.
+        """
+        tokens = estimate_tokens(contents)
+        for attempt in range(self.max_retries + 1):
+            with span("scheduler.wait", priority=PRIORITY_NAMES.get(priority, str(priority))):
+                self._acquire(priority, tokens)
+            started, error = False, None
+            try:
+                for chunk in function(contents):
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                error = e
+                if started or attempt >= self.max_retries or not is_retryable(e):
+                    raise
+            finally:
+                self._release(error)
+            self._backoff(attempt)
+
+    def _publish(self):
+        """Export the queue depth and in-flight calls as gauges; called with the lock held"""
+        tracer.set_gauge("scheduler_queue_depth", len(self._queue))
+        tracer.set_gauge("scheduler_in_flight", self._in_flight)
+
+    def stats(self):
+        """Return the live queue depth by priority, calls in flight and call counts"""
+        with self._condition:
+            waiting = {name: 0 for name in PRIORITY_NAMES.values()}
+            for priority, _ in self._queue:
+                waiting[PRIORITY_NAMES.get(priority, str(priority))] += 1
+            return {'queue_depth': len(self._queue), 'waiting': waiting, 'in_flight': self._in_flight,
+                    'max_concurrency': self.max_concurrency, **self._counts}
+
+
+scheduler = ModelScheduler()
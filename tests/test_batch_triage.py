@@ -0,0 +1,24 @@
+import batch_triage
+from scheduler import scheduler
+
+
+def test_batch_restores_the_scheduler_limits(monkeypatch):
+    monkeypatch.setattr(batch_triage, "triage_record", lambda record_id, record, **options: {'id': record_id})
+    requests = scheduler.requests
+    records = [(str(i), {'symptoms': "cough"}) for i in range(5)]
+
+    results = batch_triage.run_batch(records, workers=2, requests_per_minute=6)
+    next(results)
+    assert scheduler.requests is not requests
+    assert scheduler.requests.rate == 0.1
+    assert len(list(results)) == 4
+    assert scheduler.requests is requests
+
+
+def test_abandoned_batch_restores_the_scheduler_limits(monkeypatch):
+    monkeypatch.setattr(batch_triage, "triage_record", lambda record_id, record, **options: {'id': record_id})
+    requests = scheduler.requests
+    results = batch_triage.run_batch([("1", {}), ("2", {})], requests_per_minute=6)
+    next(results)
+    results.close()
+    assert scheduler.requests is requests
@@ -0,0 +1,60 @@
+import io
+
+import pytest
+from PIL import Image, ImageDraw
+
+from cache import MISSING
+from image_preprocessing import PerceptualHashCache, hamming_distance, preprocess_image
+
+
+def skin_photo(draw_lesion):
+    """Encode a skin-coloured photo with one lesion drawn on it"""
+    image = Image.new("RGB", (400, 300), (224, 172, 140))
+    draw_lesion(ImageDraw.Draw(image))
+    output = io.BytesIO()
+    image.save(output, format="PNG")
+    return output.getvalue()
+
+
+LESIONS = {
+    'red_spot': lambda draw: draw.ellipse((180, 130, 200, 150), fill=(200, 40, 40)),
+    'purple_bruise': lambda draw: draw.ellipse((150, 100, 250, 200), fill=(110, 60, 120)),
+    'black_lesion': lambda draw: draw.ellipse((60, 200, 90, 230), fill=(20, 15, 15)),
+}
+
+
+@pytest.fixture
+def photos():
+    return {name: preprocess_image(skin_photo(lesion)) for name, lesion in LESIONS.items()}
+
+
+def test_other_sessions_never_get_a_different_lesion(photos):
+    cache = PerceptualHashCache("test", max_distance=64)  # Every hash is a near match
+    red = photos['red_spot']
+    cache.set(red.digest, red.phash, "red spot analysis", scope="patient-a")
+    for name in ('purple_bruise', 'black_lesion'):
+        photo = photos[name]
+        assert cache.get(photo.digest, photo.phash, scope="patient-b") is MISSING
+        assert cache.get(photo.digest, photo.phash) is MISSING
+
+
+def test_identical_photo_is_shared_across_sessions(photos):
+    cache = PerceptualHashCache("test")
+    red = photos['red_spot']
+    cache.set(red.digest, red.phash, "red spot analysis", scope="patient-a")
+    assert cache.get(red.digest, red.phash, scope="patient-b") == "red spot analysis"
+    assert cache.get(red.digest, red.phash) == "red spot analysis"
+
+
+def test_near_duplicate_is_shared_within_a_session():
+    original = Image.open(io.BytesIO(skin_photo(LESIONS['red_spot'])))
+    resized = io.BytesIO()
+    original.resize((360, 270)).save(resized, format="JPEG", quality=70)
+    first, second = preprocess_image(skin_photo(LESIONS['red_spot'])), preprocess_image(resized.getvalue())
+    assert first.digest != second.digest
+    assert hamming_distance(first.phash, second.phash) <= 4
+
+    cache = PerceptualHashCache("test")
+    cache.set(first.digest, first.phash, "red spot analysis", scope="patient-a")
+    assert cache.get(second.digest, second.phash, scope="patient-a") == "red spot analysis"
+    assert cache.get(second.digest, second.phash, scope="patient-b") is MISSING
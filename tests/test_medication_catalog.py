@@ -0,0 +1,30 @@
+import pytest
+
+from medication_catalog import MedicationCatalog
+
+
+@pytest.fixture(scope="module")
+def catalog():
+    return MedicationCatalog(path=":memory:")
+
+
+@pytest.mark.parametrize("name, generic", [
+    ("Paracetamol (Crocin)", "paracetamol"),
+    ("Dolo 650", "paracetamol"),
+    ("amoxicillin clavulanate", "amoxicillin clavulanate"),
+    ("Morphine sulfate", "morphine"),
+])
+def test_whole_names_resolve(catalog, name, generic):
+    assert catalog.lookup(name).generic == generic
+
+
+@pytest.mark.parametrize("name", ["Paracetmol", "Cetiriz", "Dolo", "folic acid", "Xyz"])
+def test_misspelled_and_partial_names_are_unknown(catalog, name):
+    assert catalog.prescription_status(name) is None
+    assert catalog.products(name) is None
+
+
+def test_only_otc_medicines_get_links(catalog):
+    assert catalog.products("Crocin")
+    assert catalog.prescription_status("Augmentin") is True
+    assert catalog.products("Augmentin") is None
@@ -0,0 +1,74 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import outbound
+
+
+@pytest.fixture
+def maps(monkeypatch):
+    """Give maps one thread, a short deadline and a fresh breaker"""
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setitem(outbound.executors, 'maps', executor)
+    monkeypatch.setitem(outbound.SERVICE_LIMITS, 'maps', outbound.ServiceLimits(1, 1, 0.3, 1))
+    monkeypatch.setitem(outbound.breakers, 'maps', outbound.CircuitBreaker('maps'))
+    yield executor
+    executor.shutdown(wait=True)
+
+
+def test_deadline_starts_when_the_call_runs(maps):
+    maps.submit(time.sleep, 0.2)
+    assert outbound.call('maps', lambda: time.sleep(0.2) or "ok") == "ok"
+    assert outbound.breakers['maps'].failures == 0
+
+
+def test_call_that_never_started_is_not_a_failure(maps):
+    maps.submit(time.sleep, 0.6)
+    with pytest.raises(outbound.ServiceBusy):
+        outbound.call('maps', lambda: "ok")
+    stats = outbound.breakers['maps'].stats()
+    assert stats['failures'] == 0
+    assert stats['busy'] == 1
+
+
+def test_slow_service_does_not_starve_another(maps, monkeypatch):
+    tts = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setitem(outbound.executors, 'tts', tts)
+    tts.submit(time.sleep, 0.6)
+    assert outbound.call('maps', lambda: "ok") == "ok"
+    tts.shutdown(wait=True)
+
+
+def test_overrun_counts_as_a_failure(maps):
+    with pytest.raises(outbound.DeadlineExceeded):
+        outbound.call('maps', time.sleep, 0.5)
+    assert outbound.breakers['maps'].failures == 1
+
+
+class RateLimited(Exception):
+    code = 429
+
+
+def test_burst_of_rate_limits_does_not_open_the_breaker(monkeypatch):
+    from scheduler import ModelScheduler
+
+    monkeypatch.setitem(outbound.breakers, 'gemini', outbound.CircuitBreaker('gemini', failure_threshold=3))
+    attempts = []
+
+    def generate(contents):
+        attempts.append(contents)
+        if len(attempts) <= 7:
+            raise RateLimited("429 Resource has been exhausted")
+        return "ok"
+
+    scheduler = ModelScheduler(max_retries=3, backoff=0)
+    results = []
+    for _ in range(4):
+        try:
+            results.append(scheduler.call(lambda contents: outbound.call('gemini', generate, contents), "prompt"))
+        except RateLimited:
+            results.append(None)
+    assert results[-1] == "ok"
+    assert outbound.breakers['gemini'].state == outbound.CLOSED
+    assert outbound.breakers['gemini'].stats()['failures'] == 0
@@ -0,0 +1,38 @@
+import pytest
+
+from red_flags import SEVERE_CHEST_PAIN, pre_triage
+
+
+@pytest.mark.parametrize("symptoms, rule", [
+    ("Crushing chest pain spreading to my left arm, with sweating", "cardiac_chest_pain"),
+    ("Chest pain that goes through to my back", "cardiac_chest_pain"),
+    ("No fever but chest pain radiating to the jaw", "cardiac_chest_pain"),
+    ("My son is having fits and is not responding", "seizure"),
+    ("Had a seizure an hour ago", "seizure"),
+])
+def test_red_flags(symptoms, rule):
+    assert pre_triage({'symptoms': symptoms}).rule == rule
+
+
+@pytest.mark.parametrize("symptoms", [
+    "Fits of coughing at night for a week",
+    "Mild chest pain after exercise, and lower back pain",
+    "Chest pain, not radiating to arm",
+    "Chest tightness, not spreading to my arm or jaw",
+    "No chest pain, only a sore throat",
+])
+def test_no_false_red_flags(symptoms):
+    assert pre_triage({'symptoms': symptoms}) is None
+
+
+def test_severe_rash_on_the_chest_is_not_chest_pain():
+    assert pre_triage({'symptoms': "Itchy red rash", 'location': "Chest", 'severity': "Severe"}) is None
+
+
+def test_severe_pain_in_the_chest():
+    user_input = {'symptoms': "Sharp pain when I breathe in", 'location': "Chest", 'severity': "Severe"}
+    assert pre_triage(user_input) == SEVERE_CHEST_PAIN
+
+
+def test_uncertainty_does_not_negate():
+    assert pre_triage({'symptoms': "Not sure if my chest pain spreads to my arm"}).rule == "cardiac_chest_pain"
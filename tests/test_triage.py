@@ -0,0 +1,26 @@
+import pytest
+
+import triage
+from image_preprocessing import PreprocessedImage
+
+PHOTO = PreprocessedImage(data=b"jpeg", mime_type="image/jpeg", width=1, height=1, phash=0, digest="photo")
+ASSESSMENT = "Urgency Level: Self-care\n\n### Recommended Next Steps:\n- Keep the rash clean and dry."
+
+
+@pytest.mark.parametrize("mode", ["parallel", "sequential"])
+def test_failed_image_analysis_is_reported(monkeypatch, mode):
+    monkeypatch.setattr(triage, "analyze_images", lambda *args: "Error analyzing image: quota exceeded")
+    monkeypatch.setattr(triage, "run_assessment", lambda *args, **kwargs: ASSESSMENT)
+    response, pipeline = triage.run_assessment_pipeline({'symptoms': "Itchy rash on my arm"}, "English", [PHOTO],
+                                                        mode=mode, use_cache=False)
+    assert response == ASSESSMENT
+    assert pipeline['image_error'] == "Error analyzing image: quota exceeded"
+
+
+def test_successful_image_analysis_has_no_error(monkeypatch):
+    monkeypatch.setattr(triage, "analyze_images", lambda *args: "Visible findings: mild redness.")
+    monkeypatch.setattr(triage, "run_assessment", lambda *args, **kwargs: ASSESSMENT)
+    response, pipeline = triage.run_assessment_pipeline({'symptoms': "Itchy rash on my arm"}, "English", [PHOTO],
+                                                        mode="parallel", use_cache=False)
+    assert "Visible findings: mild redness." in response
+    assert pipeline['image_error'] is None
@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from triage import detect_urgency, parse_assessment
+from triage_result import find_json_object, parse_triage_json
+
+ASSESSMENT = {
+    "urgency": "Emergency",
+    "conditions": ["Acute coronary syndrome"],
+    "next_steps": ["Call an ambulance now"],
+    "red_flags": ["Chest pain spreading to the arm"],
+    "medications": [{"name": "Aspirin", "dose": "300 mg chewed once"}],
+}
+
+
+def test_json_after_a_preamble():
+    result = parse_assessment(f"Here is the assessment: {json.dumps(ASSESSMENT)}")
+    assert result.structured
+    assert result.is_emergency
+    assert result.medication_names == ["Aspirin"]
+
+
+def test_fenced_json_with_text_after_the_fence():
+    text = f"```json\n{json.dumps(ASSESSMENT, indent=2)}\n```\nPlease see a doctor as soon as possible."
+    result = parse_assessment(text)
+    assert result.structured
+    assert result.urgency == "Emergency"
+    assert result.conditions == ("Acute coronary syndrome",)
+
+
+def test_preamble_with_braces_before_the_object():
+    assert find_json_object('Format {as asked}: {"urgency": "Self-care"}') == {"urgency": "Self-care"}
+
+
+def test_unparseable_json_still_marks_an_emergency():
+    text = 'Here you go: {"urgency": "Emergency", "conditions": ["Stroke"], "next_steps": [truncated'
+    result = parse_assessment(text)
+    assert not result.structured
+    assert result.is_emergency
+
+
+def test_detect_urgency_finds_the_json_field_while_streaming():
+    text = '{\n  "urgency" : "Seek care soon",\n  "conditions": ['
+    assert detect_urgency(text, start=len(text) - 20) == "Seek care soon"
+
+
+def test_text_without_json_object_is_rejected():
+    with pytest.raises(ValueError):
+        parse_triage_json("Urgency Level: Self-care")
@@ -0,0 +1,32 @@
+import time
+import uuid
+
+import pytest
+
+import tts_engine
+
+
+@pytest.fixture
+def stub_speech(monkeypatch):
+    monkeypatch.setattr(tts_engine, "TTS_BACKEND", "stub")
+    monkeypatch.setattr(tts_engine, "STUB_TTS_LATENCY", 0.1)
+
+
+def sentences(count):
+    """Text of count sentences, each too long to share a chunk and unseen by the chunk cache"""
+    return " ".join(f"Sentence {i} of a test that is read aloud, {uuid.uuid4().hex * 3}." for i in range(count))
+
+
+def test_first_chunk_is_ready_before_the_rest(stub_speech):
+    text = sentences(4)
+    assert len(tts_engine.split_text(text)) == 4
+    started = time.perf_counter()
+    chunks = tts_engine.synthesize_stream(text, "English", max_workers=1)
+    next(chunks)
+    assert time.perf_counter() - started < 0.25
+    assert len(list(chunks)) == 3
+
+
+def test_streamed_chunks_join_into_the_whole_audio(stub_speech):
+    text = sentences(3)
+    assert b"".join(tts_engine.synthesize_stream(text, "English")) == tts_engine.synthesize(text, "English")
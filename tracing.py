@@ -0,0 +1,202 @@
+"""Lightweight timing spans with latency histograms and Prometheus/JSON export"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Durations kept per span name for exact recent percentiles
+RECENT_SAMPLES = 1000
+
+# Optional rolling JSON log of every span
+TRACE_LOG_PATH = os.getenv("TRACE_LOG_PATH")
+TRACE_LOG_MAX_BYTES = int(os.getenv("TRACE_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+
+
+class SpanStats:
+    """Counters, latency histogram and size totals for one span name"""
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+        self.sizes = {}  # attribute name -> [sum, max]
+
+    def add(self, seconds, error, sizes):
+        self.count += 1
+        self.errors += bool(error)
+        self.total_seconds += seconds
+        self.recent.append(seconds)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+        for name, value in sizes.items():
+            total = self.sizes.setdefault(name, [0, 0])
+            total[0] += value
+            total[1] = max(total[1], value)
+
+    def percentile(self, pct):
+        ordered = sorted(self.recent)
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+
+class Tracer:
+    """Collects spans from every session in the process"""
+
+    def __init__(self, log_path=TRACE_LOG_PATH, log_max_bytes=TRACE_LOG_MAX_BYTES):
+        self.log_path = log_path
+        self.log_max_bytes = log_max_bytes
+        self._stats = {}
+        self._recent_spans = deque(maxlen=200)
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """Time the enclosed block; numeric values set on the yielded dict are recorded as sizes"""
+        record = dict(attributes)
+        started = time.perf_counter()
+        try:
+            yield record
+        except Exception as e:
+            record['error'] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self.record(name, time.perf_counter() - started, record)
+
+    def traced(self, name):
+        """Decorator that wraps every call of a function in a span"""
+        def decorator(function):
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def record(self, name, seconds, record):
+        """Add a finished span to the metrics and the log"""
+        sizes = {key: value for key, value in record.items()
+                 if isinstance(value, (int, float)) and not isinstance(value, bool)}
+        entry = {'name': name, 'ms': round(seconds * 1000, 3), 'at': time.time(), **record}
+        with self._lock:
+            self._stats.setdefault(name, SpanStats()).add(seconds, record.get('error'), sizes)
+            self._recent_spans.append(entry)
+            if self.log_path:
+                self._write_log(entry)
+
+    def _write_log(self, entry):
+        """Append to the JSON log, keeping one rotated copy when it grows too large"""
+        try:
+            if os.path.exists(self.log_path) and os.path.getsize(self.log_path) > self.log_max_bytes:
+                os.replace(self.log_path, self.log_path + ".1")
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+        except OSError:
+            pass  # Tracing must never break the app
+
+    def snapshot(self):
+        """Return per-span counts, error counts and latency percentiles in milliseconds"""
+        with self._lock:
+            return [
+                {
+                    'span': name,
+                    'count': stats.count,
+                    'errors': stats.errors,
+                    'mean_ms': round(1000 * stats.total_seconds / stats.count, 1),
+                    'p50_ms': round(1000 * stats.percentile(50), 1),
+                    'p95_ms': round(1000 * stats.percentile(95), 1),
+                    'max_ms': round(1000 * max(stats.recent), 1),
+                    **{f"avg_{size}": round(total[0] / stats.count) for size, total in stats.sizes.items()},
+                }
+                for name, stats in sorted(self._stats.items())
+            ]
+
+    def set_gauge(self, name, value):
+        """Set a live value, such as a queue depth, exported next to the span metrics"""
+        self._gauges[name] = value
+
+    def recent_spans(self, limit=50):
+        """Return the most recent spans, newest first"""
+        with self._lock:
+            return list(self._recent_spans)[::-1][:limit]
+
+    def prometheus_text(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = [
+            "# HELP triage_span_seconds Duration of traced calls",
+            "# TYPE triage_span_seconds histogram",
+        ]
+        with self._lock:
+            items = sorted(self._stats.items())
+            for name, stats in items:
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, stats.buckets):
+                    cumulative += count
+                    lines.append(f'triage_span_seconds_bucket{{span="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'triage_span_seconds_bucket{{span="{name}",le="+Inf"}} {stats.count}')
+                lines.append(f'triage_span_seconds_sum{{span="{name}"}} {stats.total_seconds}')
+                lines.append(f'triage_span_seconds_count{{span="{name}"}} {stats.count}')
+
+            lines += ["# HELP triage_span_errors_total Traced calls that raised",
+                      "# TYPE triage_span_errors_total counter"]
+            lines += [f'triage_span_errors_total{{span="{name}"}} {stats.errors}' for name, stats in items]
+
+            lines += ["# HELP triage_span_size_total Sum of sizes recorded on spans, such as prompt characters",
+                      "# TYPE triage_span_size_total counter"]
+            for name, stats in items:
+                for size, total in sorted(stats.sizes.items()):
+                    lines.append(f'triage_span_size_total{{span="{name}",size="{size}"}} {total[0]}')
+
+            for name, value in sorted(self._gauges.items()):
+                lines += [f"# TYPE triage_{name} gauge", f"triage_{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+tracer = Tracer()
+span = tracer.span
+traced = tracer.traced
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port, host="0.0.0.0"):
+    """Serve the Prometheus metrics at /metrics from a background thread, once per process"""
+    global _server
+    with _server_lock:
+        if _server is not None:
+            return _server
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] == "/metrics":
+                    body, content_type = tracer.prometheus_text(), "text/plain; version=0.0.4"
+                elif self.path.split("?")[0] == "/spans":
+                    body, content_type = json.dumps(tracer.recent_spans(200), default=str), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        _server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+        return _server
@@ -0,0 +1,578 @@
+"""Health assessment core shared by the Streamlit app and the batch triage runner"""
+import hashlib
+import html
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+
+from dotenv import load_dotenv
+
+from cache import MISSING, MemoryCache, SQLiteCache, shared_cache
+from image_preprocessing import PerceptualHashCache, image_blob
+from medication_lexicon import highlight_medications, medication_names
+from model_backend import get_backend
+from scheduler import ASSESSMENT, FOLLOW_UP, estimate_tokens, scheduler
+from tracing import span, traced
+from triage_result import TRIAGE_SCHEMA, Medication, TriageResult, parse_triage_json
+
+# Load environment variables
+load_dotenv()
+
+# Model backend for every generation call, chosen with MODEL_BACKEND
+backend = get_backend()
+MODEL_NAME = backend.model_name
+
+# Cache health assessments by prompt content, in memory or on disk
+response_cache = shared_cache(
+    "responses",
+    factory=SQLiteCache if os.getenv("RESPONSE_CACHE_BACKEND", "memory") == "disk" else MemoryCache,
+    ttl=int(os.getenv("RESPONSE_CACHE_TTL", "86400")),  # 1 day
+    max_entries=int(os.getenv("RESPONSE_CACHE_SIZE", "500"))
+)
+RESPONSE_CACHE_BYPASS = os.getenv("RESPONSE_CACHE_BYPASS", "").lower() in ("1", "true", "yes")
+
+# Reuse image analyses for re-uploads of the same photo, or of a nearly identical one in the same session
+image_analysis_cache = shared_cache(
+    "image_analysis",
+    factory=PerceptualHashCache,
+    ttl=int(os.getenv("IMAGE_ANALYSIS_CACHE_TTL", "86400")),  # 1 day
+    max_entries=int(os.getenv("IMAGE_ANALYSIS_CACHE_SIZE", "256")),
+    max_distance=int(os.getenv("IMAGE_HASH_MAX_DISTANCE", "4"))
+)
+
+# Nutrition plans, keyed by their prompt, and the pool that prefetches them after an assessment
+nutrition_cache = shared_cache(
+    "nutrition",
+    factory=MemoryCache,
+    ttl=int(os.getenv("NUTRITION_CACHE_TTL", "86400")),  # 1 day
+    max_entries=int(os.getenv("NUTRITION_CACHE_SIZE", "500"))
+)
+nutrition_executor = ThreadPoolExecutor(max_workers=int(os.getenv("NUTRITION_PREFETCH_WORKERS", "4")),
+                                        thread_name_prefix="nutrition-prefetch")
+NUTRITION_PREFETCH = os.getenv("NUTRITION_PREFETCH", "true").lower() in ("1", "true", "yes")
+# Characters of a free-text assessment kept in the nutrition prompt when its conditions cannot be parsed
+NUTRITION_CONTEXT_CHARS = int(os.getenv("NUTRITION_CONTEXT_CHARS", "600"))
+
+IMAGE_ANALYSIS_PROMPT = ("Analyze this medical image for symptoms, possible conditions, and urgency level. "
+                         "Focus on visible symptoms like rashes, wounds, swelling, or discoloration. "
+                         "Provide recommendations similar to the text analysis format. "
+                         "State the urgency level exactly as \"Urgency Level: Emergency\", "
+                         "\"Urgency Level: Seek care soon\" or \"Urgency Level: Self-care\".")
+# Several photos are analyzed in one request, each under its own "Photo N:" heading
+IMAGE_BATCH_ANALYSIS_PROMPT = ("Analyze these {count} medical images of the same patient, which may show the same "
+                               "symptoms from different angles, for symptoms, possible conditions, and urgency level. "
+                               "Focus on visible symptoms like rashes, wounds, swelling, or discoloration. "
+                               "Start the analysis of each image on its own line with \"Photo N:\", numbering the "
+                               "images in the order given, and state each urgency level exactly as "
+                               "\"Urgency Level: Emergency\", \"Urgency Level: Seek care soon\" or "
+                               "\"Urgency Level: Self-care\".")
+PHOTO_HEADING = re.compile(r"^[#*\s]*Photo (\d+)[*\s]*:[*\s]*", re.M)
+
+# How image submissions are assessed: one multimodal call, image and text calls
+# in parallel, or image analysis followed by the text assessment
+PIPELINE_MODES = ("single", "parallel", "sequential")
+ASSESSMENT_PIPELINE = os.getenv("ASSESSMENT_PIPELINE", "single")
+# Urgency as free text marks it, or as the urgency field of a JSON answer that could not be parsed
+URGENCY_PATTERN = re.compile(r'(?:Urgency Level: |"urgency"\s*:\s*")(Emergency|Seek care soon|Self-care)')
+URGENCY_MARKER_LENGTH = len("Urgency Level: Seek care soon") + 8  # Room for spaces around a JSON colon
+URGENCY_RANK = {"Self-care": 0, "Seek care soon": 1, "Emergency": 2}
+URGENCY_COLORS = {"Emergency": "red", "Seek care soon": "orange", "Self-care": "green"}
+
+# Free-text assessments, or JSON following TRIAGE_SCHEMA that is parsed into a TriageResult
+OUTPUT_FORMATS = ("text", "json")
+OUTPUT_FORMAT = os.getenv("OUTPUT_FORMAT", "text")
+
+LIST_MARKER = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s*")
+DOSAGE_PATTERN = re.compile(r"(\d+\s?mg|\d+\s?times per day|\d+\s?hours)")
+MEDICATION_HIGHLIGHT = '<span style="background-color:#979291; padding:2px 5px; border-radius:4px; border:1px solid #cce0ff">{}</span>'
+DOSAGE_HIGHLIGHT = '<span style="font-weight:bold; color:#0066cc">{}</span>'
+MEDICATION_HEADER = '<h4 style="color:#2b5876; margin-top:20px">💊 Medication Recommendations:</h4>'
+
+
+def analyze_image(image, priority=ASSESSMENT, use_cache=True, cache_scope=None):
+    """Analyze a preprocessed image for medical symptoms"""
+    analysis = image_analysis_cache.get(image.digest, image.phash, cache_scope) if use_cache else MISSING
+    if analysis is not MISSING:
+        return analysis
+    
+    try:
+        with span("gemini.analyze_image", image_bytes=len(image.data)) as trace:
+            analysis = scheduler.call(backend.generate, [IMAGE_ANALYSIS_PROMPT, image_blob(image)], priority)
+            trace['response_chars'] = len(analysis)
+    except Exception as e:
+        return f"Error analyzing image: {str(e)}"
+    
+    if use_cache:
+        image_analysis_cache.set(image.digest, image.phash, analysis, cache_scope)
+    return analysis
+
+def split_photo_analyses(text, count):
+    """Split a batched image analysis into one analysis per photo, or return None when it has no clear sections"""
+    headings = list(PHOTO_HEADING.finditer(text))
+    numbers = [int(heading.group(1)) for heading in headings]
+    if numbers != list(range(1, count + 1)):
+        return None
+    ends = [heading.start() for heading in headings[1:]] + [len(text)]
+    return [text[heading.end():end].strip() for heading, end in zip(headings, ends)]
+
+def combine_image_analyses(analyses):
+    """Join per-photo analyses into the visual analysis given to the assessment prompt"""
+    if len(analyses) == 1:
+        return analyses[0]
+    return "\n\n".join(f"Photo {i}:\n{analysis}" for i, analysis in enumerate(analyses, 1))
+
+def analyze_images(images, priority=ASSESSMENT, use_cache=True, cache_scope=None):
+    """Analyze several preprocessed images in one request, reusing cached analyses of any of them
+    
+    Near-duplicate photos share an analysis only within cache_scope, such as one
+    user's session; otherwise only the exact same photo does.
+    """
+    if len(images) == 1:
+        return analyze_image(images[0], priority, use_cache, cache_scope)
+    
+    analyses = [image_analysis_cache.get(image.digest, image.phash, cache_scope) if use_cache else MISSING
+                for image in images]
+    missing = [i for i, analysis in enumerate(analyses) if analysis is MISSING]
+    if len(missing) == 1:
+        analyses[missing[0]] = analyze_image(images[missing[0]], priority, use_cache, cache_scope)
+    elif missing:
+        batch = [images[i] for i in missing]
+        prompt = IMAGE_BATCH_ANALYSIS_PROMPT.format(count=len(batch))
+        try:
+            with span("gemini.analyze_images", images=len(batch),
+                      image_bytes=sum(len(image.data) for image in batch)) as trace:
+                response = scheduler.call(backend.generate, [prompt, *map(image_blob, batch)], priority)
+                trace['response_chars'] = len(response)
+        except Exception as e:
+            return f"Error analyzing image: {str(e)}"
+        
+        sections = split_photo_analyses(response, len(batch))
+        if sections is None:
+            # Without a section per photo the batch can only be used as a whole, and is not cached
+            cached = [analysis for analysis in analyses if analysis is not MISSING]
+            return combine_image_analyses(cached + [response]) if cached else response
+        for i, section in zip(missing, sections):
+            if use_cache:
+                image_analysis_cache.set(images[i].digest, images[i].phash, section, cache_scope)
+            analyses[i] = section
+    
+    failed = [analysis for analysis in analyses if is_error_response(analysis)]
+    return failed[0] if failed else combine_image_analyses(analyses)
+
+def build_assessment_prompt(user_input, language, image_analysis=None, image_count=0, output_format="text"):
+    """Build the health assessment prompt from patient information"""
+    language_instruction = {
+        "English": "Provide all recommendations in English.",
+        "Hindi": "Provide all recommendations in Hindi (हिंदी में).",
+        "Telugu": "Provide all recommendations in Telugu (తెలుగులో)."
+    }.get(language, "Provide all recommendations in English.")
+    
+    patient_info = f"""
+Patient Information:
+- Symptoms: {user_input.get('symptoms', 'Not specified')}
+- Duration: {user_input.get('duration', 'Not specified')}
+- Severity: {user_input.get('severity', 'Not specified')}
+- Location: {user_input.get('location', 'Not specified')}
+- Onset: {user_input.get('onset', 'Not specified')}
+- Age: {user_input.get('age', 'Not specified')}
+- Gender: {user_input.get('gender', 'Not specified')}
+- Medical History: {user_input.get('medical_history', 'Not specified')}
+- Current Medications: {user_input.get('medications', 'Not specified')}
+- Allergies: {user_input.get('allergies', 'Not specified')}
+- Lifestyle: {user_input.get('lifestyle', 'Not specified')}
+"""
+    
+    visual_analysis = f"\n\nAdditional Visual Symptom Analysis:\n{image_analysis}" if image_analysis else ""
+    if image_count == 1:
+        visual_analysis += ("\n\nA photo of the visible symptoms is attached. Analyze it for rashes, wounds, "
+                            "swelling, or discoloration and include the findings in your assessment.")
+    elif image_count > 1:
+        visual_analysis += (f"\n\n{image_count} photos of the visible symptoms, possibly from different angles, are "
+                            "attached. Analyze them together for rashes, wounds, swelling, or discoloration and "
+                            "include the findings in your assessment.")
+    
+    if output_format == "json":
+        formatting = f"""IMPORTANT FORMATTING:
+- Respond only with a JSON object matching this JSON schema, with no text before or after it:
+{json.dumps(TRIAGE_SCHEMA)}
+- "urgency" must be exactly "Emergency", "Seek care soon" or "Self-care" in English
+- Write all other values in the requested language, except medication names"""
+    else:
+        formatting = """IMPORTANT FORMATTING:
+- Urgency level must use exactly:
+  * "Urgency Level: Emergency" (red)
+  * "Urgency Level: Seek care soon" (orange)
+  * "Urgency Level: Self-care" (green)
+
+- Medication section must begin with: "### Medication Recommendations:\""""
+    
+    prompt = f"""You are an AI Health Assistant. Analyze the following patient information and provide detailed recommendations:
+
+1. Possible conditions (list 3-5 most likely, ordered by probability)
+2. Urgency level (emergency, seek care soon, self-care)
+3. Recommended next steps (when to see a doctor, self-care tips)
+4. Any red flag symptoms to watch for
+5. SPECIFIC MEDICATION RECOMMENDATIONS (both prescription and OTC options)
+
+MEDICATION GUIDELINES:
+- For common/minor issues: Suggest specific OTC medications with standard dosages
+- For serious conditions: State that prescription medications are needed and list common options doctors might prescribe
+- Always consider the patient's current medications and allergies
+- Include both generic and brand names when available
+- Provide standard adult dosages (unless pediatric case)
+- Highlight important warnings (allergies, interactions, side effects)
+- Still recommend doctor consultation for proper diagnosis
+
+{formatting}
+
+{language_instruction}
+
+{patient_info}
+{visual_analysis}
+
+Provide clear, actionable recommendations while emphasizing safety.
+"""
+    return prompt
+
+def response_cache_key(user_input, language, image_digest=None, image_analysis=None, output_format="text"):
+    """Hash the normalized prompt, keyed on the image digest rather than its analysis text"""
+    prompt = " ".join(build_assessment_prompt(user_input, language, output_format=output_format).lower().split())
+    visual = image_digest or " ".join((image_analysis or "").lower().split())
+    return hashlib.sha256(f"{MODEL_NAME}\0{prompt}\0{visual}".encode()).hexdigest()
+
+def get_cached_response(user_input, language, image_digest=None, output_format="text"):
+    """Return a cached health assessment, or None if there is none"""
+    response = response_cache.get(response_cache_key(user_input, language, image_digest, output_format=output_format))
+    return None if response is MISSING else response
+
+def generate_response(user_input, language, image_analysis=None, image_digest=None, use_cache=True, images=(),
+                      output_format="text", priority=ASSESSMENT):
+    """Generate health assessment using Gemini with image analysis"""
+    cache_key = response_cache_key(user_input, language, image_digest, image_analysis, output_format)
+    if use_cache:
+        response = response_cache.get(cache_key)
+        if response is not MISSING:
+            return response
+    
+    prompt = build_assessment_prompt(user_input, language, image_analysis, image_count=len(images),
+                                     output_format=output_format)
+    try:
+        with span("gemini.generate", prompt_chars=len(prompt)) as trace:
+            response = scheduler.call(backend.generate, [prompt, *images] if images else prompt, priority)
+            trace['response_chars'] = len(response)
+    except Exception as e:
+        return f"Error generating response: {str(e)}"
+    
+    if use_cache:
+        response_cache.set(cache_key, response)
+    return response
+
+def generate_response_stream(user_input, language, image_analysis=None, image_digest=None, use_cache=True, images=(),
+                             output_format="text", priority=ASSESSMENT):
+    """Yield the health assessment in chunks as Gemini generates it"""
+    cache_key = response_cache_key(user_input, language, image_digest, image_analysis, output_format)
+    if use_cache:
+        response = response_cache.get(cache_key)
+        if response is not MISSING:
+            yield response
+            return
+    
+    prompt = build_assessment_prompt(user_input, language, image_analysis, image_count=len(images),
+                                     output_format=output_format)
+    chunks = []
+    try:
+        with span("gemini.stream", prompt_chars=len(prompt)) as trace:
+            started = time.perf_counter()
+            for chunk in scheduler.stream(backend.stream, [prompt, *images] if images else prompt, priority):
+                if not chunks:
+                    trace['first_chunk_ms'] = round(1000 * (time.perf_counter() - started))
+                chunks.append(chunk)
+                yield chunk
+            trace['response_chars'] = sum(len(chunk) for chunk in chunks)
+    except Exception as e:
+        yield f"Error generating response: {str(e)}"
+        return
+    
+    if use_cache:
+        response_cache.set(cache_key, "".join(chunks))
+
+def detect_urgency(text, start=0):
+    """Return the urgency level marked in text, only searching from around start onwards"""
+    match = URGENCY_PATTERN.search(text, max(0, start - URGENCY_MARKER_LENGTH))
+    return match.group(1) if match else None
+
+def color_urgency_level(text):
+    """Add color to the urgency level in the response text"""
+    if "Urgency Level: Emergency" in text:
+        return re.sub(
+            r"Urgency Level: Emergency", 
+            r'<span style="color:red; font-weight:bold">Urgency Level: Emergency</span>', 
+            text
+        )
+    elif "Urgency Level: Seek care soon" in text:
+        return re.sub(
+            r"Urgency Level: Seek care soon", 
+            r'<span style="color:orange; font-weight:bold">Urgency Level: Seek care soon</span>', 
+            text
+        )
+    elif "Urgency Level: Self-care" in text:
+        return re.sub(
+            r"Urgency Level: Self-care", 
+            r'<span style="color:green; font-weight:bold">Urgency Level: Self-care</span>', 
+            text
+        )
+    return text
+
+def enhance_medication_display(text):
+    """Improve the display of medication information"""
+    # Highlight section header
+    text = text.replace("### Medication Recommendations:", MEDICATION_HEADER)
+    
+    # Highlight medication names
+    text = highlight_medications(text, MEDICATION_HIGHLIGHT)
+    
+    # Highlight dosage information
+    text = DOSAGE_PATTERN.sub(lambda match: DOSAGE_HIGHLIGHT.format(match.group(1)), text)
+    
+    return text
+
+def render_assessment_html(result):
+    """Render an assessment as HTML, laying out structured results directly instead of rescanning text"""
+    if not result.structured:
+        return enhance_medication_display(color_urgency_level(result.text))
+    
+    def bullets(items):
+        return "\n".join(f"- {html.escape(item)}" for item in items)
+    
+    color = URGENCY_COLORS[result.urgency]
+    medications = "\n".join(
+        f"- {MEDICATION_HIGHLIGHT.format(html.escape(m.name))}"
+        + (f": {DOSAGE_HIGHLIGHT.format(html.escape(m.dose))}" if m.dose else "")
+        for m in result.medications
+    )
+    sections = [
+        "### Possible Conditions:\n" + "\n".join(f"{i}. {html.escape(c)}" for i, c in enumerate(result.conditions, 1)),
+        f'<span style="color:{color}; font-weight:bold">Urgency Level: {result.urgency}</span>',
+        "### Recommended Next Steps:\n" + bullets(result.next_steps),
+        "### Red Flag Symptoms:\n" + bullets(result.red_flags),
+        f"{MEDICATION_HEADER}\n\n{medications}",
+    ]
+    if result.notes:
+        sections.append(html.escape(result.notes))
+    if result.visual_analysis:
+        sections.append(f"### Visual Symptom Analysis:\n{html.escape(result.visual_analysis)}")
+    return "\n\n".join(sections)
+
+def section_items(text, heading):
+    """Return the list items under a markdown heading of a free-text assessment"""
+    match = re.search(rf"#+\s*{heading}:?[^\n]*\n(.*?)(?=\n#|\nUrgency Level|\Z)", text, re.S)
+    if not match:
+        return ()
+    items = (LIST_MARKER.sub("", line).strip() for line in match.group(1).splitlines())
+    return tuple(item for item in items if item)
+
+def assessment_summary(result):
+    """Summarize an assessment in a few lines, so follow-up prompts do not repeat the full text"""
+    lines = [f"Urgency: {result.urgency or 'Not stated'}"]
+    if result.conditions:
+        lines.append("Likely conditions: " + "; ".join(result.conditions[:3]))
+    else:
+        # Without parsed conditions, such as a Hindi or Telugu free-text answer, keep its opening
+        lines.append("Assessment excerpt: " + " ".join(result.text.split())[:NUTRITION_CONTEXT_CHARS])
+    if result.medications:
+        lines.append("Recommended medications: " + ", ".join(result.medication_names))
+    return "\n".join(lines)
+
+def build_nutrition_prompt(result, user_info, language="English"):
+    """Build the nutrition prompt from a summary of the assessment and the patient information"""
+    return f"""As a nutritionist, provide dietary recommendations based on:
+
+Health Assessment Summary:
+{assessment_summary(result)}
+
+Patient Information:
+- Age: {user_info.get('age', 'Not specified')}
+- Gender: {user_info.get('gender', 'Not specified')}
+- Conditions: {user_info.get('medical_history', 'Not specified')}
+- Medications: {user_info.get('medications', 'Not specified')}
+- Allergies: {user_info.get('allergies', 'Not specified')}
+- Lifestyle: {user_info.get('lifestyle', 'Not specified')}
+
+Provide:
+1. Recommended foods and avoidances (consider allergies)
+2. Sample 1-day meal plan
+3. Key nutrients to focus on
+4. Hydration recommendations
+5. Supplement suggestions (if needed)
+6. Special considerations based on medications
+
+Format with clear headings and use food emojis for better readability. Write in {language}."""
+
+def generate_nutrition_recommendations(result, user_info, language="English", use_cache=True):
+    """Generate personalized nutrition advice for an assessment, reusing cached plans"""
+    prompt = build_nutrition_prompt(result, user_info, language)
+    cache_key = hashlib.sha256(f"{MODEL_NAME}\0{prompt}".encode()).hexdigest()
+    if use_cache:
+        advice = nutrition_cache.get(cache_key)
+        if advice is not MISSING:
+            return advice
+    
+    try:
+        with span("gemini.nutrition", prompt_chars=len(prompt), prompt_tokens=estimate_tokens(prompt)) as trace:
+            advice = scheduler.call(backend.generate, prompt, FOLLOW_UP)
+            trace['response_chars'] = len(advice)
+    except Exception as e:
+        return f"Error generating nutrition advice: {str(e)}"
+    
+    if use_cache:
+        nutrition_cache.set(cache_key, advice)
+    return advice
+
+def prefetch_nutrition_recommendations(result, user_info, language="English", use_cache=True):
+    """Start generating the nutrition plan in the background and return its future"""
+    return nutrition_executor.submit(generate_nutrition_recommendations, result, user_info, language, use_cache)
+
+def extract_medication_names(text):
+    """Extract medication names from the response text"""
+    return medication_names(text)
+
+def run_assessment(user_input, language, image_analysis=None, image_digest=None, use_cache=True, images=(),
+                   render_stream=None, output_format="text", priority=ASSESSMENT):
+    """Generate the assessment, passing streamed chunks to render_stream when it is given"""
+    options = dict(image_digest=image_digest, use_cache=use_cache, images=images, output_format=output_format,
+                   priority=priority)
+    if render_stream:
+        return render_stream(generate_response_stream(user_input, language, image_analysis, **options))
+    return generate_response(user_input, language, image_analysis, **options)
+
+def reconcile_assessments(text_response, image_analysis):
+    """Merge a text-only assessment with a separate image analysis, keeping the higher urgency"""
+    image_level = max(URGENCY_PATTERN.findall(image_analysis), key=URGENCY_RANK.get, default=None)
+    result = parse_assessment(text_response)
+    if result.structured:
+        urgency = result.urgency
+        if image_level and URGENCY_RANK[image_level] > URGENCY_RANK[urgency]:
+            urgency = image_level
+        return replace(result, urgency=urgency, visual_analysis=image_analysis).to_json()
+    
+    text_level = result.urgency
+    if image_level and text_level and URGENCY_RANK[image_level] > URGENCY_RANK[text_level]:
+        text_response = text_response.replace(f"Urgency Level: {text_level}", f"Urgency Level: {image_level}", 1)
+    elif image_level and not text_level:
+        text_response = f"Urgency Level: {image_level}\n\n{text_response}"
+    return f"{text_response}\n\n### Visual Symptom Analysis:\n{image_analysis}"
+
+def images_digest(images):
+    """Identify a set of photos in order, matching a single photo's own digest"""
+    if len(images) == 1:
+        return images[0].digest
+    return hashlib.sha256("\0".join(image.digest for image in images).encode()).hexdigest() if images else None
+
+def run_assessment_pipeline(user_input, language, uploaded_images=(), mode="single", use_cache=True, render_stream=None,
+                            output_format="text", priority=ASSESSMENT, cache_scope=None):
+    """Run the assessment in the chosen pipeline mode and return the response with per-stage timings
+    
+    Any number of photos costs one image request at most, however they are assessed.
+    cache_scope is the session whose near-duplicate photos may share an image analysis.
+    When a separate image analysis fails, the report's image_error says why, so the
+    caller can warn that the assessment could not use the photos.
+    """
+    timings = {}
+    image_error = None
+    started = time.perf_counter()
+    uploaded_images = list(uploaded_images or ())
+    digest = images_digest(uploaded_images)
+    
+    # A cached assessment for the same image also skips the image analysis call
+    response = get_cached_response(user_input, language, digest, output_format) if use_cache and digest else None
+    if response is not None:
+        timings['cache'] = time.perf_counter() - started
+        return response, {'mode': 'cache', 'timings': timings}
+    
+    if mode == "parallel" and not str(user_input.get('symptoms', '')).strip():
+        mode = "single"  # Without symptoms a text-only call has nothing to assess
+    
+    if not uploaded_images:
+        mode = "text"
+        response = run_assessment(user_input, language, use_cache=use_cache, render_stream=render_stream,
+                                  output_format=output_format, priority=priority)
+        timings['assessment'] = time.perf_counter() - started
+    
+    elif mode == "single":
+        response = run_assessment(user_input, language, image_digest=digest, use_cache=use_cache,
+                                  images=[image_blob(image) for image in uploaded_images], render_stream=render_stream,
+                                  output_format=output_format, priority=priority)
+        timings['assessment'] = time.perf_counter() - started
+    
+    elif mode == "parallel":
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            image_future = executor.submit(analyze_images, uploaded_images, priority, use_cache, cache_scope)
+            response = run_assessment(user_input, language, use_cache=use_cache, render_stream=render_stream,
+                                      output_format=output_format, priority=priority)
+            timings['assessment'] = time.perf_counter() - started
+            image_analysis = image_future.result()
+            timings['image_analysis'] = time.perf_counter() - started
+        
+        reconcile_started = time.perf_counter()
+        if is_error_response(image_analysis):
+            image_error = image_analysis  # The text-only assessment stands, without the photos
+        elif not is_error_response(response):
+            response = reconcile_assessments(response, image_analysis)
+            if use_cache:
+                response_cache.set(response_cache_key(user_input, language, digest, output_format=output_format),
+                                   response)
+        timings['reconcile'] = time.perf_counter() - reconcile_started
+    
+    else:
+        mode = "sequential"
+        image_analysis = analyze_images(uploaded_images, priority, use_cache, cache_scope)
+        timings['image_analysis'] = time.perf_counter() - started
+        if is_error_response(image_analysis):
+            image_error = image_analysis
+            digest = None  # Do not cache a failed analysis under the image digest
+        response = run_assessment(user_input, language, image_analysis, image_digest=digest,
+                                  use_cache=use_cache, render_stream=render_stream, output_format=output_format,
+                                  priority=priority)
+        timings['assessment'] = time.perf_counter() - started - timings['image_analysis']
+    
+    timings['total'] = time.perf_counter() - started
+    return response, {'mode': mode, 'timings': timings, 'image_error': image_error}
+
+def format_pipeline_report(pipeline):
+    """Describe the pipeline mode and stage timings in one line"""
+    stages = " · ".join(f"{stage.replace('_', ' ')} {seconds:.2f}s" for stage, seconds in pipeline['timings'].items())
+    return f"⏱️ Pipeline: {pipeline['mode']} · {stages}"
+    
+
+ERROR_PREFIXES = ("Error generating response", "Error analyzing image", "Error generating nutrition advice")
+
+def is_error_response(text):
+    """Check whether text is an error message returned in place of a model response"""
+    return text.startswith(ERROR_PREFIXES)
+
+@traced("postprocess.parse_assessment")
+def parse_assessment(response):
+    """Parse an assessment once into a TriageResult, from JSON output or by scanning free text"""
+    if "{" in response:
+        try:
+            return parse_triage_json(response)
+        except ValueError:
+            pass  # Not valid JSON after all, so read it as free text, still finding a JSON urgency field
+    
+    medications = ()
+    if "### Medication Recommendations:" in response:
+        medications = tuple(Medication(name) for name in extract_medication_names(response))
+    return TriageResult(text=response, urgency=detect_urgency(response), medications=medications,
+                        conditions=section_items(response, "Possible Conditions"))
+
+def extract_triage_fields(response):
+    """Pull the urgency level, emergency flag and medication names out of an assessment"""
+    result = parse_assessment(response)
+    return {
+        'urgency': result.urgency,
+        'is_emergency': result.is_emergency,
+        'medications': result.medication_names
+    }
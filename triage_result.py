@@ -0,0 +1,139 @@
+"""Structured health assessments parsed once from the model's JSON output"""
+import json
+from dataclasses import dataclass
+
+URGENCY_LEVELS = ("Emergency", "Seek care soon", "Self-care")
+
+# JSON schema the model is asked to follow in the json output format
+TRIAGE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "urgency": {"type": "string", "enum": list(URGENCY_LEVELS)},
+        "conditions": {"type": "array", "items": {"type": "string"},
+                       "description": "3-5 most likely conditions, ordered by probability"},
+        "next_steps": {"type": "array", "items": {"type": "string"}},
+        "red_flags": {"type": "array", "items": {"type": "string"}},
+        "medications": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string", "description": "generic name in English"},
+                    "dose": {"type": "string", "description": "standard dose, frequency and warnings"},
+                },
+                "required": ["name", "dose"],
+            },
+        },
+        "notes": {"type": "string"},
+    },
+    "required": ["urgency", "conditions", "next_steps", "red_flags", "medications"],
+}
+
+@dataclass(frozen=True, slots=True)
+class Medication:
+    name: str
+    dose: str = ""
+
+
+@dataclass(frozen=True, slots=True)
+class TriageResult:
+    """A health assessment, parsed once and used for rendering, speech and reports"""
+    text: str  # Markdown shown, read aloud and printed
+    urgency: str = None
+    conditions: tuple = ()
+    next_steps: tuple = ()
+    red_flags: tuple = ()
+    medications: tuple = ()  # Medication items
+    notes: str = ""
+    visual_analysis: str = ""
+    structured: bool = False  # Parsed from JSON rather than scraped from free text
+
+    @property
+    def is_emergency(self):
+        return self.urgency == "Emergency"
+
+    @property
+    def medication_names(self):
+        return [medication.name for medication in self.medications]
+
+    def to_json(self):
+        """Serialize the structured fields in the schema's format"""
+        data = {
+            'urgency': self.urgency,
+            'conditions': list(self.conditions),
+            'next_steps': list(self.next_steps),
+            'red_flags': list(self.red_flags),
+            'medications': [{'name': m.name, 'dose': m.dose} for m in self.medications],
+            'notes': self.notes,
+        }
+        if self.visual_analysis:
+            data['visual_analysis'] = self.visual_analysis
+        return json.dumps(data, ensure_ascii=False)
+
+
+def bullet_list(items):
+    return "\n".join(f"- {item}" for item in items)
+
+
+def result_markdown(urgency, conditions, next_steps, red_flags, medications, notes="", visual_analysis=""):
+    """Lay the structured fields out in the same sections as the free-text assessment"""
+    sections = [
+        "### Possible Conditions:\n" + "\n".join(f"{i}. {c}" for i, c in enumerate(conditions, 1)),
+        f"Urgency Level: {urgency}",
+        "### Recommended Next Steps:\n" + bullet_list(next_steps),
+        "### Red Flag Symptoms:\n" + bullet_list(red_flags),
+        "### Medication Recommendations:\n" + bullet_list(f"{m.name}: {m.dose}" if m.dose else m.name
+                                                         for m in medications),
+    ]
+    if notes:
+        sections.append(notes)
+    if visual_analysis:
+        sections.append(f"### Visual Symptom Analysis:\n{visual_analysis}")
+    return "\n\n".join(sections)
+
+
+def string_list(data, key):
+    value = data.get(key) or []
+    if not isinstance(value, list):
+        raise ValueError(f"{key} must be a list")
+    return tuple(str(item).strip() for item in value if str(item).strip())
+
+
+def find_json_object(text):
+    """Decode the first JSON object in text, skipping any preamble, code fence or text after it"""
+    decoder = json.JSONDecoder()
+    start = text.find("{")
+    while start != -1:
+        try:
+            data, _ = decoder.raw_decode(text, start)
+        except ValueError:
+            pass
+        else:
+            if isinstance(data, dict):
+                return data
+        start = text.find("{", start + 1)
+    raise ValueError("assessment has no JSON object")
+
+
+def parse_triage_json(text):
+    """Parse a JSON assessment into a TriageResult, raising ValueError when it does not fit the schema"""
+    data = find_json_object(text)
+    urgency = data.get('urgency')
+    if urgency not in URGENCY_LEVELS:
+        raise ValueError(f"unknown urgency level {urgency!r}")
+
+    medications = []
+    for item in data.get('medications') or []:
+        if isinstance(item, dict) and str(item.get('name', '')).strip():
+            medications.append(Medication(str(item['name']).strip(), str(item.get('dose', '')).strip()))
+
+    fields = dict(
+        urgency=urgency,
+        conditions=string_list(data, 'conditions'),
+        next_steps=string_list(data, 'next_steps'),
+        red_flags=string_list(data, 'red_flags'),
+        medications=tuple(medications),
+        notes=str(data.get('notes') or "").strip(),
+        visual_analysis=str(data.get('visual_analysis') or "").strip(),
+    )
+    return TriageResult(text=result_markdown(**fields), structured=True, **fields)
@@ -0,0 +1,126 @@
+"""Text-to-speech that synthesizes sentence chunks in parallel and caches them
+
+synthesize_stream yields the chunks in reading order as they are ready, so
+the first sentences can be played while the rest are still synthesized.
+"""
+import hashlib
+import io
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import outbound
+from cache import MISSING, MemoryCache, shared_cache
+from tracing import span, traced
+
+# Longest chunk of text sent in one synthesis call
+TTS_CHUNK_CHARS = int(os.getenv("TTS_CHUNK_CHARS", "200"))
+# Chunks synthesized at the same time
+TTS_WORKERS = int(os.getenv("TTS_WORKERS", "8"))
+
+# Speech backend: "gtts" calls Google's TTS service, "stub" returns silence locally for load tests
+TTS_BACKEND = os.getenv("TTS_BACKEND", "gtts").lower()
+STUB_TTS_LATENCY = float(os.getenv("STUB_TTS_LATENCY", "0.1"))
+# One silent MPEG-1 Layer III frame at 128 kbps and 44.1 kHz, about 26 ms of audio
+SILENT_MP3_FRAME = b"\xff\xfb\x90\x64" + bytes(413)
+
+# gTTS language code and Google domain for each output language
+VOICES = {
+    "English": ("en", "com"),
+    "Hindi": ("hi", "co.in"),
+    "Telugu": ("te", "co.in"),
+}
+
+SENTENCE_END = re.compile(r"(?<=[.!?।])\s+|\n+")
+HTML_TAG = re.compile(r"<[^>]*>")
+MARKDOWN_SYMBOLS = re.compile(r"[#*_`>|]+")
+
+chunk_cache = shared_cache(
+    "tts_chunks",
+    factory=MemoryCache,
+    ttl=int(os.getenv("TTS_CACHE_TTL", "86400")),  # 1 day
+    max_entries=int(os.getenv("TTS_CACHE_SIZE", "2000"))
+)
+
+
+def clean_text(text):
+    """Strip HTML tags and markdown symbols that should not be read aloud"""
+    return MARKDOWN_SYMBOLS.sub("", HTML_TAG.sub(" ", text))
+
+
+def split_text(text, max_chars=TTS_CHUNK_CHARS):
+    """Split text into chunks of whole sentences no longer than max_chars where possible"""
+    chunks = []
+    current = ""
+    for sentence in SENTENCE_END.split(clean_text(text)):
+        sentence = " ".join(sentence.split())
+        if not sentence:
+            continue
+        if current and len(current) + len(sentence) + 1 > max_chars:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def synthesize_chunk(chunk, language):
+    """Return MP3 bytes for one chunk of text, using the chunk cache"""
+    lang, tld = VOICES.get(language, VOICES["English"])
+    key = hashlib.sha256(f"{lang}\0{tld}\0{chunk}".encode()).hexdigest()
+    audio = chunk_cache.get(key)
+    if audio is not MISSING:
+        return audio
+
+    if TTS_BACKEND == "stub":
+        audio = stub_speech(chunk)
+    else:
+        audio = gtts_speech(chunk, lang, tld)
+    chunk_cache.set(key, audio)
+    return audio
+
+
+def gtts_speech(chunk, lang, tld):
+    """Return MP3 bytes for chunk from Google's text-to-speech service"""
+    from gtts import gTTS
+
+    output = io.BytesIO()
+    with span("gtts.synthesize_chunk", text_chars=len(chunk)) as record:
+        tts = gTTS(text=chunk, lang=lang, tld=tld, slow=False, timeout=outbound.timeouts('tts'))
+        outbound.call('tts', tts.write_to_fp, output)
+        audio = output.getvalue()
+        record['audio_bytes'] = len(audio)
+    return audio
+
+
+def stub_speech(chunk):
+    """Return silence about as long as chunk would take to read, after the stub latency"""
+    with span("stub.synthesize_chunk", text_chars=len(chunk)):
+        time.sleep(STUB_TTS_LATENCY)
+        return SILENT_MP3_FRAME * max(1, len(chunk) // 15)
+
+
+def synthesize_stream(text, language, max_workers=TTS_WORKERS):
+    """Yield MP3 bytes for each chunk of text in reading order, synthesizing the chunks in parallel"""
+    chunks = split_text(text)
+    if len(chunks) <= 1:
+        yield from (synthesize_chunk(chunk, language) for chunk in chunks)
+        return
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks))))
+    try:
+        futures = [executor.submit(synthesize_chunk, chunk, language) for chunk in chunks]
+        for future in futures:
+            yield future.result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)  # A caller that stops reading drops the chunks left
+
+
+@traced("tts.synthesize")
+def synthesize(text, language, max_workers=TTS_WORKERS):
+    """Return MP3 bytes for the whole text, synthesizing its chunks in parallel"""
+    # MP3 frames can simply be concatenated, so the chunks join into one stream
+    return b"".join(synthesize_stream(text, language, max_workers))